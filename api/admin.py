@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared-secret protection for admin endpoints.
+
+Admin endpoints require an ``X-Admin-Token`` header equal to the
+ADMIN_TOKEN environment variable. Without ADMIN_TOKEN they are disabled.
+"""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def check_admin_token(token: Optional[str], expected: str = None) -> bool:
+    """Constant-time comparison of a presented token with the configured one"""
+    expected = ADMIN_TOKEN if expected is None else expected
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """FastAPI dependency for admin endpoints"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Helpers for packing several advice requests into one Gemini prompt.
+
+The model is asked for a JSON array with one object per task, each carrying
+the task "id" it answers. Entries that are missing or malformed come back
+as None so the caller can fill them with fallback advice.
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+
+# Maximum number of tasks packed into a single prompt
+BATCH_PROMPT_SIZE = int(os.getenv("ADVICE_BATCH_PROMPT_SIZE", "10"))
+
+# Maximum number of items accepted by one /advice/batch request
+MAX_BATCH_ITEMS = int(os.getenv("ADVICE_BATCH_MAX_ITEMS", "100"))
+
+VALID_VERDICTS = ("good", "ok", "avoid")
+
+# Ask Gemini for a bare JSON answer (no markdown) in multi-answer prompts
+BATCH_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+
+def extract_json_text(text: str) -> str:
+    """Strip a markdown code fence around a JSON answer, if there is one"""
+    text = text.strip()
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0].strip()
+    return text
+
+
+def group_for_prompts(items: Sequence, group_key: Callable, max_size: int = BATCH_PROMPT_SIZE) -> List[List[int]]:
+    """Group item indices by group_key and split every group into prompt-sized chunks"""
+    groups: Dict[Hashable, List[int]] = OrderedDict()
+    for index, item in enumerate(items):
+        groups.setdefault(group_key(item), []).append(index)
+
+    chunks = []
+    size = max(1, max_size)
+    for indices in groups.values():
+        for start in range(0, len(indices), size):
+            chunks.append(indices[start:start + size])
+    return chunks
+
+
+def parse_batch_answers(text: str, count: int) -> List[Optional[dict]]:
+    """Parse a JSON array of answers with 1-based "id" fields.
+
+    Returns a list of length ``count``; every position holds the answer
+    dict for that task or None when the model omitted or garbled it.
+    """
+    answers: List[Optional[dict]] = [None] * count
+    try:
+        data = json.loads(extract_json_text(text))
+    except (json.JSONDecodeError, TypeError):
+        return answers
+
+    if isinstance(data, dict):
+        data = data.get("answers", data.get("results", []))
+    if not isinstance(data, list):
+        return answers
+
+    for position, entry in enumerate(data):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("id", position + 1)) - 1
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < count or answers[index] is not None:
+            continue
+        if entry.get("verdict") not in VALID_VERDICTS:
+            continue
+        if not isinstance(entry.get("reason"), str) or not isinstance(entry.get("suggestion"), str):
+            continue
+        answers[index] = entry
+    return answers
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+In-process LRU + TTL cache for generated advice.
+
+Entries are keyed on a normalized task string plus phase and locale, so
+"Провести презентацию" and "  провести   презентацию. " share one entry.
+
+An entry can carry a tag naming the knowledge base version it was derived
+from. A lookup with a different tag is a miss, and invalidate_tags() drops
+the entries of versions that were reloaded, leaving all others warm.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional, Tuple
+
+DEFAULT_MAX_SIZE = int(os.getenv("ADVICE_CACHE_SIZE", "1024"))
+DEFAULT_TTL = float(os.getenv("ADVICE_CACHE_TTL", "3600"))
+
+
+def normalize_task(task: str) -> str:
+    """Lowercase the task, collapse whitespace and drop trailing punctuation"""
+    return " ".join(task.lower().split()).strip(" .!?;,")
+
+
+def make_cache_key(task: str, phase: str, locale: str) -> Tuple[str, str, str]:
+    """Build the cache key for an advice request"""
+    return normalize_task(task), phase.strip().lower(), locale.strip().lower()
+
+
+class AdviceCache:
+    """Bounded LRU cache with a time-to-live for every entry"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Hashable, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, tag: Hashable = None) -> Optional[dict]:
+        """Return a copy of the cached advice or None (also when tagged with another version)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, entry_tag, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if tag is not None and entry_tag != tag:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def set(self, key: Hashable, value: dict, tag: Hashable = None):
+        """Store a copy of the advice, evicting the least recently used entries"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tag, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_tags(self, tags: Iterable[Hashable]) -> int:
+        """Drop every entry carrying one of the tags; return how many were dropped"""
+        tags = set(tags)
+        if not tags:
+            return 0
+        with self._lock:
+            stale = [key for key, (_, tag, _) in self._entries.items() if tag in tags]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Helpers for streaming advice as Server-Sent Events.
+
+The model streams a JSON object, so the text of the "reason" and
+"suggestion" fields is pulled out of the partial answer as it grows and
+only the newly arrived part is sent to the client.
+"""
+
+import json
+import re
+from typing import Dict, Iterable, List
+
+STREAM_FIELDS = ("reason", "suggestion")
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def partial_json_string(text: str, field: str) -> str:
+    """Return the (possibly unfinished) string value of a field in partial JSON"""
+    match = re.search(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)(\\?)' % re.escape(field), text)
+    if not match:
+        return ""
+    raw = match.group(1)
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        # Cut an unfinished \uXXXX escape and try again
+        cut = raw.rfind("\\")
+        try:
+            return json.loads(f'"{raw[:cut]}"') if cut >= 0 else raw
+        except json.JSONDecodeError:
+            return ""
+
+
+class FieldStreamer:
+    """Track how much of each streamed field has already been sent"""
+
+    def __init__(self, fields: Iterable[str] = STREAM_FIELDS):
+        self.sent: Dict[str, int] = {field: 0 for field in fields}
+
+    def feed(self, text: str) -> List[dict]:
+        """Return new {"field", "text"} deltas found in the accumulated text"""
+        deltas = []
+        for field, sent in self.sent.items():
+            value = partial_json_string(text, field)
+            if len(value) > sent:
+                deltas.append({"field": field, "text": value[sent:]})
+                self.sent[field] = len(value)
+        return deltas
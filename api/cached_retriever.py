@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Retriever wrapper that memoizes query embeddings and top-k results.
+
+Both caches are keyed on the normalized query text and bounded with LRU
+eviction. Query embeddings only depend on the embedding model, so they
+survive re-ingestion; retrieval results are dropped as soon as the index
+version reported by ``version_fn`` changes.
+
+Passing ``phase`` to ``invoke()`` restricts the search to chunks tagged
+with that cycle phase or with the shared "general" phase.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from advice_cache import normalize_task
+from md_chunker import GENERAL_PHASE
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+
+
+def phase_filter(phase: str) -> dict:
+    """Metadata filter for the chunks of one phase plus the shared general ones"""
+    return {"phase": {"$in": [phase, GENERAL_PHASE]}}
+
+
+class CachingRetriever(BaseRetriever):
+    """Vector store retriever with query-embedding and result caches"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    k: int = 4
+    search_kwargs: dict = {}
+    cache_size: int = RETRIEVAL_CACHE_SIZE
+    version_fn: Optional[Callable[[], Any]] = None
+
+    _embeddings: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _results: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _version: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _counters: dict = PrivateAttr(default_factory=lambda: {
+        "result_hits": 0, "embedding_hits": 0, "misses": 0, "invalidations": 0
+    })
+
+    def _remember(self, cache: OrderedDict, key: str, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _check_version(self):
+        version = self.version_fn() if self.version_fn else None
+        if version != self._version:
+            if self._results:
+                self._counters["invalidations"] += 1
+            self._results.clear()
+            self._version = version
+
+    def _search(self, text: str, embedding, phase: Optional[str]) -> List[Document]:
+        if phase:
+            docs = self.vectorstore.similarity_search_by_vector(
+                embedding, k=self.k, filter=phase_filter(phase), **self.search_kwargs)
+            if docs:
+                return docs
+            # Index built without phase metadata (or unknown phase): search everything
+        return self.vectorstore.similarity_search_by_vector(embedding, k=self.k, **self.search_kwargs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                phase: Optional[str] = None) -> List[Document]:
+        text = normalize_task(query)
+        key = f"{phase or ''}\n{text}"
+        with self._lock:
+            self._check_version()
+            version = self._version
+            docs = self._results.get(key)
+            if docs is not None:
+                self._results.move_to_end(key)
+                self._counters["result_hits"] += 1
+                return list(docs)
+            embedding = self._embeddings.get(text)
+            if embedding is not None:
+                self._embeddings.move_to_end(text)
+                self._counters["embedding_hits"] += 1
+            else:
+                self._counters["misses"] += 1
+
+        if embedding is None:
+            embedding = self.vectorstore.embeddings.embed_query(text)
+        docs = self._search(text, embedding, phase)
+
+        with self._lock:
+            self._remember(self._embeddings, text, embedding)
+            self._check_version()
+            # Results computed against an index that was swapped meanwhile are not kept
+            if self._version == version:
+                self._remember(self._results, key, list(docs))
+        return docs
+
+    def clear(self):
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "embeddings_cached": len(self._embeddings),
+                "results_cached": len(self._results),
+                "index_version": self._version,
+            }
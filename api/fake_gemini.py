@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline stand-in for Gemini, selected with LLM_BACKEND=fake.
+
+Implements just the surface the servers use:
+
+- FakeGenerativeModel: ``generate_content`` / ``generate_content_async``
+  (also with ``stream=True``) like ``genai.GenerativeModel``
+- FakeChatModel: ``invoke`` / ``ainvoke`` like ``ChatGoogleGenerativeAI``
+- FakeEmbeddings: the local hashing embeddings behind the same latency
+  and failure injection
+
+Answers are valid advice JSON derived from the prompt: the cycle phase
+picks the likely verdict, a hash of the task picks the rest, and batch
+prompts ("Задача N:" / "Task N:") get a JSON array with one object per
+task. Latency, errors, malformed answers and markdown fences are drawn
+from a random generator seeded with FAKE_LLM_SEED, the prompt and how
+many times that prompt was seen, so a run is reproducible no matter how
+concurrent requests interleave.
+
+    LLM_BACKEND=fake FAKE_LLM_LATENCY_MS=800 FAKE_LLM_ERROR_RATE=0.05 python main_rag.py
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+# "fixed", "uniform", "lognormal" or "exponential" around FAKE_LLM_LATENCY_MS.
+# Jitter is the +/- fraction for uniform and sigma for lognormal.
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal").lower()
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+FAKE_LLM_LATENCY_JITTER = float(os.getenv("FAKE_LLM_LATENCY_JITTER", "0.4"))
+
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+# Share of answers wrapped in a ```json fence, as the real model often does
+FAKE_LLM_FENCE_RATE = float(os.getenv("FAKE_LLM_FENCE_RATE", "0"))
+
+# Streaming: characters per chunk and the delay between chunks
+FAKE_LLM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "24"))
+FAKE_LLM_CHUNK_MS = float(os.getenv("FAKE_LLM_CHUNK_MS", "15"))
+
+FAKE_EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "30"))
+FAKE_EMBED_ERROR_RATE = float(os.getenv("FAKE_EMBED_ERROR_RATE", "0"))
+
+# Prompts whose attempt counter is remembered; the least recently seen are dropped
+FAKE_LLM_ATTEMPT_KEYS = int(os.getenv("FAKE_LLM_ATTEMPT_KEYS", "10000"))
+
+PHASE_LINE_RE = re.compile(r"^(?:Фаза цикла|Cycle phase):\s*(.+)$", re.MULTILINE)
+TASK_RE = re.compile(r"^(?:Задача|Task):\s*(.+)$", re.MULTILINE)
+BATCH_TASK_RE = re.compile(r"^(?:Задача|Task) (\d+):\s*(.+)$", re.MULTILINE)
+
+# Word stems that name a phase in the prompt (phase ids and descriptions)
+PHASE_STEMS = {
+    "menstruation": ("menstruation", "менструац"),
+    "follicular": ("follicular", "фолликул"),
+    "ovulation": ("ovulation", "овуляц"),
+    "luteal": ("luteal", "лютеал"),
+}
+
+# Likely verdicts per phase; the task hash picks one
+PHASE_VERDICTS = {
+    "menstruation": ("avoid", "avoid", "ok"),
+    "follicular": ("good", "good", "ok"),
+    "ovulation": ("good", "good", "good", "ok"),
+    "luteal": ("ok", "ok", "avoid", "good"),
+}
+
+ANSWER_TEXT = {
+    "ru": {
+        "good": ("энергии достаточно для задачи «{task}»", "запланируйте «{task}» на первую половину дня"),
+        "ok": ("задача «{task}» выполнима, но без запаса сил", "разбейте «{task}» на короткие блоки с перерывами"),
+        "avoid": ("на «{task}» сейчас мало энергии", "по возможности перенесите «{task}» на пару дней"),
+    },
+    "en": {
+        "good": ("there is enough energy for \"{task}\"", "schedule \"{task}\" for the first half of the day"),
+        "ok": ("\"{task}\" is doable but leaves little reserve", "split \"{task}\" into short blocks with breaks"),
+        "avoid": ("energy is low for \"{task}\" right now", "move \"{task}\" a couple of days later if you can"),
+    },
+}
+
+
+class FakeLLMError(Exception):
+    """Injected failure, shaped like a transient API error"""
+
+
+def prompt_hash(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+class FaultInjector:
+    """Latency and failure draws, reproducible per (seed, prompt, attempt)"""
+
+    def __init__(self, latency: str = FAKE_LLM_LATENCY, latency_ms: float = FAKE_LLM_LATENCY_MS,
+                 jitter: float = FAKE_LLM_LATENCY_JITTER, error_rate: float = FAKE_LLM_ERROR_RATE,
+                 seed: int = FAKE_LLM_SEED):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self._attempts = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def rng(self, text: str) -> random.Random:
+        """Generator for the next call with this text"""
+        key = prompt_hash(text)
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            self._attempts.move_to_end(key)
+            if len(self._attempts) > FAKE_LLM_ATTEMPT_KEYS:
+                self._attempts.popitem(last=False)
+            self.calls += 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+    def delay(self, rng: random.Random) -> float:
+        """Sampled latency in seconds"""
+        mean = self.latency_ms / 1000.0
+        if mean <= 0 or self.latency == "fixed":
+            return max(0.0, mean)
+        if self.latency == "uniform":
+            return max(0.0, rng.uniform(mean * (1 - self.jitter), mean * (1 + self.jitter)))
+        if self.latency == "exponential":
+            return rng.expovariate(1.0 / mean)
+        # lognormal with the configured value as its median: a long right tail
+        return rng.lognormvariate(math.log(mean), self.jitter)
+
+    def maybe_fail(self, rng: random.Random, what: str):
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise FakeLLMError(f"503 {what} unavailable (injected by the fake backend)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
+
+
+def detect_phase(prompt: str) -> Optional[str]:
+    match = PHASE_LINE_RE.search(prompt)
+    line = match.group(1).lower() if match else ""
+    for phase, stems in PHASE_STEMS.items():
+        if any(stem in line for stem in stems):
+            return phase
+    return None
+
+
+def make_answer(task: str, phase: Optional[str], locale: str) -> dict:
+    """Deterministic advice for one task"""
+    h = prompt_hash(f"{phase}\n{task}")
+    verdicts = PHASE_VERDICTS.get(phase, ("ok", "good", "avoid"))
+    verdict = verdicts[h % len(verdicts)]
+    reason, suggestion = ANSWER_TEXT[locale][verdict]
+    short_task = task.strip()[:60]
+    return {
+        "verdict": verdict,
+        "reason": reason.format(task=short_task),
+        "suggestion": suggestion.format(task=short_task),
+        "confidence": round(0.55 + (h >> 8) % 41 / 100, 2),
+    }
+
+
+def answer_for(prompt: str) -> str:
+    """Well-formed JSON answer to a single or batch advice prompt"""
+    locale = "ru" if re.search("[а-яА-Я]", prompt) else "en"
+    phase = detect_phase(prompt)
+    batch = BATCH_TASK_RE.findall(prompt)
+    if batch:
+        answers = [{"id": int(number), **make_answer(task, phase, locale)} for number, task in batch]
+        return json.dumps(answers, ensure_ascii=False)
+    match = TASK_RE.search(prompt)
+    task = match.group(1) if match else prompt[-200:]
+    return json.dumps(make_answer(task, phase, locale), ensure_ascii=False)
+
+
+def render_answer(prompt: str, rng: random.Random, malformed_rate: float = FAKE_LLM_MALFORMED_RATE,
+                  fence_rate: float = FAKE_LLM_FENCE_RATE) -> str:
+    """Answer text as the model would send it: maybe fenced, maybe broken"""
+    text = answer_for(prompt)
+    if rng.random() < malformed_rate:
+        # Either cut off mid-object or prose around half an answer
+        cut = text[:rng.randint(1, max(1, len(text) - 2))]
+        text = cut if rng.random() < 0.5 else f"Конечно! Вот мой совет: {cut}"
+    if rng.random() < fence_rate:
+        text = f"```json\n{text}\n```"
+    return text
+
+
+def prompt_text(contents) -> str:
+    """Flatten a prompt, a list of parts or a list of chat messages into text"""
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for part in contents:
+        if isinstance(part, dict):
+            parts.append(str(part.get("content", part.get("text", ""))))
+        elif isinstance(part, (tuple, list)) and len(part) == 2:
+            parts.append(str(part[1]))
+        else:
+            parts.append(str(getattr(part, "content", part)))
+    return "\n".join(parts)
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeResponse:
+    """Non-streaming answer: only ``.text`` is used by the servers"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStreamResponse:
+    """Async iterator of chunks with ``.text``; ``.text`` is the whole answer"""
+
+    def __init__(self, text: str, chunk_chars: int = FAKE_LLM_CHUNK_CHARS, chunk_delay: float = FAKE_LLM_CHUNK_MS / 1000.0):
+        self.text = text
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_delay = chunk_delay
+
+    async def __aiter__(self):
+        for start in range(0, len(self.text), self.chunk_chars):
+            if start and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield FakeChunk(self.text[start:start + self.chunk_chars])
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel in the advice servers"""
+
+    def __init__(self, model_name: str = "gemini-1.5-flash", faults: FaultInjector = None, **kwargs):
+        self.model_name = model_name
+        self.faults = faults or FaultInjector()
+
+    def generate_content(self, contents, generation_config=None, stream: bool = False, **kwargs):
+        prompt = prompt_text(contents)
+        rng = self.faults.rng(prompt)
+        time.sleep(self.faults.delay(rng))
+        self.faults.maybe_fail(rng, "model")
+        text = render_answer(prompt, rng)
+        if stream:
+            return [FakeChunk(text[i:i + FAKE_LLM_CHUNK_CHARS]) for i in range(0, len(text), FAKE_LLM_CHUNK_CHARS)]
+        return FakeResponse(text)
+
+    async def generate_content_async(self, contents, generation_config=None, stream: bool = False, **kwargs):
+        prompt = prompt_text(contents)
+        rng = self.faults.rng(prompt)
+        # With stream=True the delay is the time to the first chunk
+        await asyncio.sleep(self.faults.delay(rng))
+        self.faults.maybe_fail(rng, "model")
+        text = render_answer(prompt, rng)
+        return FakeStreamResponse(text) if stream else FakeResponse(text)
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """Drop-in for ChatGoogleGenerativeAI (invoke / ainvoke -> .content)"""
+
+    def __init__(self, model: str = "gemini-1.5-flash", faults: FaultInjector = None, **kwargs):
+        self.model = model
+        self._llm = FakeGenerativeModel(model, faults=faults)
+
+    def invoke(self, messages, **kwargs) -> FakeMessage:
+        return FakeMessage(self._llm.generate_content(messages).text)
+
+    async def ainvoke(self, messages, **kwargs) -> FakeMessage:
+        return FakeMessage((await self._llm.generate_content_async(messages)).text)
+
+
+def _fake_embeddings_class():
+    """FakeEmbeddings builds on the hashing embeddings (numpy, langchain_core), which
+    the fake Gemini model of main_simple does not need, so it is created on first use"""
+    from local_embeddings import HashingEmbeddings
+
+    class FakeEmbeddings(HashingEmbeddings):
+        """Local hashing embeddings that behave like a remote API: slow and sometimes failing"""
+
+        def __init__(self, latency_ms: float = FAKE_EMBED_LATENCY_MS, error_rate: float = FAKE_EMBED_ERROR_RATE,
+                     seed: int = FAKE_LLM_SEED, **kwargs):
+            super().__init__(**kwargs)
+            # Fixed latency per call: batches cost the same as single queries, like the real API
+            self.faults = FaultInjector("fixed", latency_ms, 0.0, error_rate, seed)
+
+        @property
+        def model_name(self) -> str:
+            return "fake-" + super().model_name
+
+        def _call(self, texts: List[str]):
+            rng = self.faults.rng("\n".join(texts))
+            time.sleep(self.faults.delay(rng))
+            self.faults.maybe_fail(rng, "embedding")
+
+        def embed_matrix(self, texts: List[str]):
+            self._call(texts)
+            return super().embed_matrix(texts)
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return self.embed_matrix(texts).tolist()
+
+        def embed_query(self, text: str) -> List[float]:
+            self._call([text])
+            return self._vector(text).tolist()
+
+    return FakeEmbeddings
+
+
+def __getattr__(name: str):
+    if name == "FakeEmbeddings":
+        cls = globals()["FakeEmbeddings"] = _fake_embeddings_class()
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Background reload of the knowledge base.
+
+A Reloader runs a rebuild function in a background thread whenever it is
+triggered, either by the admin endpoint or by a polling watcher that
+compares the (path, mtime, size) signature of the watched files. Only one
+rebuild runs at a time; triggers that arrive meanwhile are folded into a
+single follow-up rebuild. The rebuild function builds the new index
+completely and then swaps it in with one assignment, so requests keep
+being served from the old index until the new one is ready.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Hashable, Iterable, Optional
+
+RELOAD_POLL_SECONDS = float(os.getenv("KB_RELOAD_POLL_SECONDS", "2"))
+
+
+def files_signature(paths: Iterable[str]) -> tuple:
+    """(path, mtime, size) of every existing file; changes when any of them is edited"""
+    signature = []
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class Reloader:
+    """Runs rebuild() in the background on demand or when the watched files change"""
+
+    def __init__(self, rebuild: Callable[[], None], signature: Optional[Callable[[], Hashable]] = None,
+                 poll_interval: float = RELOAD_POLL_SECONDS, name: str = "knowledge"):
+        self.rebuild = rebuild
+        self.signature = signature
+        self.poll_interval = poll_interval
+        self.name = name
+        self.version = 0
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_reason = None
+        self.last_duration = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = None
+        self._watching = False
+
+    def start_watching(self):
+        """Start the polling watcher thread (no-op without a signature or interval)"""
+        if self._watching or self.signature is None or self.poll_interval <= 0:
+            return
+        self._watching = True
+        threading.Thread(target=self._watch, name=f"{self.name}-watcher", daemon=True).start()
+
+    def _watch(self):
+        last = self.signature()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                current = self.signature()
+            except Exception as e:
+                print(f"⚠️  {self.name} watcher error: {e}")
+                continue
+            if current != last:
+                last = current
+                self.trigger("file change")
+
+    def trigger(self, reason: str = "manual") -> bool:
+        """Schedule a rebuild; False if one is running (it will run again afterwards)"""
+        with self._lock:
+            if self._running:
+                self._pending = reason
+                return False
+            self._running = True
+        threading.Thread(target=self._run, args=(reason,), name=f"{self.name}-reload", daemon=True).start()
+        return True
+
+    def _run(self, reason: str):
+        while reason is not None:
+            started = time.monotonic()
+            try:
+                self.rebuild()
+                self.version += 1
+                self.reloads += 1
+                self.last_error = None
+                print(f"🔄 {self.name} reloaded ({reason}), version {self.version}")
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"❌ {self.name} reload failed ({reason}): {e}")
+            self.last_reason = reason
+            self.last_duration = round(time.monotonic() - started, 3)
+            with self._lock:
+                reason, self._pending = self._pending, None
+                if reason is None:
+                    self._running = False
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "reloading": self._running,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_reason": self.last_reason,
+            "last_duration_seconds": self.last_duration,
+            "last_error": self.last_error,
+            "watching": self._watching,
+        }
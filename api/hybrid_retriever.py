@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Two-stage hybrid retriever: BM25 prefilter, dense rerank, rank fusion.
+
+A BM25 index (rag_index.KnowledgeIndex) over the chunks of the vector
+store picks the best ``prefilter_size`` candidates for the query. Only
+their stored vectors are fetched and scored against the query embedding,
+so the dense work is bounded by the prefilter size instead of the corpus
+size. Both rankings are fused with reciprocal rank fusion (RRF).
+
+Queries without any lexical match fall back to the plain dense search of
+CachingRetriever, which also provides the query and result caches. When
+BM25 finds fewer than k candidates (e.g. a Russian task against English
+chunks) the fused list is filled up with dense results.
+"""
+
+import os
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from pydantic import PrivateAttr
+
+from cached_retriever import CachingRetriever
+from md_chunker import GENERAL_PHASE
+from rag_index import KnowledgeIndex
+
+HYBRID_PREFILTER_SIZE = int(os.getenv("HYBRID_PREFILTER_SIZE", "200"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+
+def rrf_fuse(rankings: List[List[str]], rrf_k: int = HYBRID_RRF_K) -> List[str]:
+    """Reciprocal rank fusion of several rankings of ids, best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+
+class HybridRetriever(CachingRetriever):
+    """CachingRetriever whose search is a lexical prefilter plus a dense rerank"""
+
+    prefilter_size: int = HYBRID_PREFILTER_SIZE
+    rrf_k: int = HYBRID_RRF_K
+
+    _lexical: Any = PrivateAttr(default=None)
+    _lexical_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _hybrid_counters: dict = PrivateAttr(default_factory=lambda: {
+        "prefiltered": 0, "candidates_scored": 0, "dense_fallbacks": 0, "dense_fills": 0
+    })
+
+    def _lexical_index(self):
+        """(index, chunk ids) over the current contents of the vector store"""
+        version = self.version_fn() if self.version_fn else None
+        with self._lexical_lock:
+            if self._lexical is None or self._lexical[0] != version:
+                stored = self.vectorstore.get(include=["documents", "metadatas"])
+                entries = [
+                    ((metadata or {}).get("phase", GENERAL_PHASE),
+                     (metadata or {}).get("heading_path", ""),
+                     doc_id, text)
+                    for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+                ]
+                self._lexical = (version, KnowledgeIndex.from_entries(entries), stored["ids"])
+            return self._lexical[1], self._lexical[2]
+
+    def _search(self, text: str, embedding, phase: Optional[str]) -> List[Document]:
+        # Stage 1: BM25 over all chunks of the phase (and the general ones)
+        index, ids = self._lexical_index()
+        phases = [phase, GENERAL_PHASE] if phase else None
+        lexical = [ids[doc_id] for doc_id, _ in index.top(text, phases, self.prefilter_size)]
+        if not lexical:
+            with self._lock:
+                self._hybrid_counters["dense_fallbacks"] += 1
+            return super()._search(text, embedding, phase)
+
+        # Stage 2: dense scores for the candidates only
+        stored = self.vectorstore.get(ids=lexical, include=["embeddings", "documents", "metadatas"])
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = (vectors @ query) / norms
+        dense = [stored["ids"][i] for i in np.argsort(-scores)]
+        with self._lock:
+            self._hybrid_counters["prefiltered"] += 1
+            self._hybrid_counters["candidates_scored"] += len(dense)
+
+        # Stage 3: fuse both rankings
+        by_id = {
+            doc_id: Document(page_content=content, metadata=metadata or {}, id=doc_id)
+            for doc_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        fused = rrf_fuse([lexical, dense], self.rrf_k)
+        docs = [by_id[doc_id] for doc_id in fused[:self.k] if doc_id in by_id]
+        if len(docs) < self.k:
+            # Stage 4: too few lexical candidates, fill up with the best dense matches
+            with self._lock:
+                self._hybrid_counters["dense_fills"] += 1
+            seen = {doc.id or doc.page_content for doc in docs}
+            for doc in super()._search(text, embedding, phase):
+                if len(docs) >= self.k:
+                    break
+                if (doc.id or doc.page_content) not in seen:
+                    seen.add(doc.id or doc.page_content)
+                    docs.append(doc)
+        return docs
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update(self._hybrid_counters)
+        stats["prefilter_size"] = self.prefilter_size
+        return stats
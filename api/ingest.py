@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Incremental ingestion of knowledge base chunks into a persisted vector store.
+
+Every chunk gets a content-hash id. On startup the existing collection is
+opened and only chunks whose id is not stored yet are embedded; ids that
+are stored but no longer produced by the splitter are deleted. Restarting
+with an unchanged knowledge base therefore costs no embedding calls.
+
+The whole knowledge directory is ingested as a pipeline: files are
+streamed by a generator, read and chunked in a process pool, and new
+chunks are embedded in size-bounded batches by a few threads with retry
+and exponential backoff. Run it as a script to build an index ahead of
+deployment:
+
+    python ingest.py --store numpy --embeddings local
+"""
+
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator, List, Tuple
+
+DEFAULT_COLLECTION = "langchain"
+
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", "../Data/Knowledge")
+KNOWLEDGE_EXTENSIONS = (".md", ".markdown", ".txt")
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "3"))
+EMBED_BACKOFF_SECONDS = 1.0
+
+# Below this many files chunking runs in-process: starting the pool costs more
+PARALLEL_MIN_FILES = 8
+
+
+def chunk_id(doc) -> str:
+    """Stable id of a chunk: hash of its source, phase tag and text.
+
+    The phase is part of the id so a retagged chunk replaces its stale copy.
+    """
+    source = doc.metadata.get("source", "")
+    phase = doc.metadata.get("phase", "")
+    digest = hashlib.sha256(f"{source}\n{phase}\n{doc.page_content}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Step 1: files -> chunks
+
+def iter_knowledge_files(root: str = KNOWLEDGE_DIR) -> Iterator[str]:
+    """Yield knowledge base files under root in a stable order, skipping hidden ones"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        for name in sorted(filenames):
+            if not name.startswith(".") and name.lower().endswith(KNOWLEDGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def load_and_chunk(path: str) -> List:
+    """Read one file and split it into chunks (runs in a worker process)"""
+    from md_chunker import chunk_markdown
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return chunk_markdown(text, {"source": path})
+
+
+def chunk_files(paths: Iterable[str], workers: int = INGEST_WORKERS) -> Iterator[List]:
+    """Yield the chunks of every file, in order, chunking in a process pool"""
+    paths = iter(paths)
+    head = list(itertools.islice(paths, PARALLEL_MIN_FILES))
+    if workers <= 1 or len(head) < PARALLEL_MIN_FILES:
+        for path in itertools.chain(head, paths):
+            yield load_and_chunk(path)
+        return
+
+    # spawn: the API server calls this from its warm-up thread
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        yield from pool.map(load_and_chunk, itertools.chain(head, paths), chunksize=4)
+
+
+def load_knowledge_dir(root: str = KNOWLEDGE_DIR, workers: int = INGEST_WORKERS) -> Tuple[List, dict]:
+    """Chunk every knowledge file under root; return (chunks, stats)"""
+    started = time.monotonic()
+    docs, files = [], 0
+    for chunks in chunk_files(iter_knowledge_files(root), workers):
+        files += 1
+        docs.extend(chunks)
+    seconds = time.monotonic() - started
+
+    stats = {
+        "files": files,
+        "chunks": len(docs),
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(files / seconds, 1) if seconds else None,
+        "chunks_per_sec": round(len(docs) / seconds, 1) if seconds else None,
+    }
+    print(f"📂 Chunked {files} files into {len(docs)} chunks in {stats['seconds']}s "
+          f"({stats['docs_per_sec']} docs/s, {stats['chunks_per_sec']} chunks/s)")
+    return docs, stats
+
+
+# Step 2: chunks -> vector store
+
+def with_retry(fn, *args, retries: int = EMBED_RETRIES, backoff: float = EMBED_BACKOFF_SECONDS, **kwargs):
+    """Call fn, retrying failures with exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"⚠️  Embedding batch failed ({e}), retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def add_in_batches(vectorstore, docs: List, ids: List[str], batch_size: int = EMBED_BATCH_SIZE,
+                   concurrency: int = EMBED_CONCURRENCY, retries: int = EMBED_RETRIES):
+    """Embed and add docs in batches of batch_size, at most concurrency batches at a time"""
+    batches = [
+        (docs[start:start + batch_size], ids[start:start + batch_size])
+        for start in range(0, len(docs), batch_size)
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embed") as pool:
+        if hasattr(vectorstore, "add_embeddings"):
+            # NumpyVectorStore rewrites its matrix on every add: embed all batches, write once
+            embeddings = vectorstore.embeddings
+            embed = getattr(embeddings, "embed_matrix", embeddings.embed_documents)
+            vectors = pool.map(
+                lambda batch: with_retry(embed, [doc.page_content for doc in batch[0]], retries=retries),
+                batches
+            )
+            rows = [row for batch_vectors in vectors for row in batch_vectors]
+            vectorstore.add_embeddings(
+                [doc.page_content for doc in docs], rows,
+                metadatas=[doc.metadata for doc in docs], ids=ids
+            )
+        else:
+            add = partial(with_retry, vectorstore.add_documents, retries=retries)
+            list(pool.map(lambda batch: add(batch[0], ids=batch[1]), batches))
+
+
+def sync_vectorstore(vectorstore, docs: List, batch_size: int = EMBED_BATCH_SIZE,
+                     concurrency: int = EMBED_CONCURRENCY, retries: int = EMBED_RETRIES) -> dict:
+    """Embed new chunks and delete vanished ones; return what was done.
+
+    A store with exclusive() (NumpyVectorStore) is synced under its directory
+    lock: when several workers sync the same change, the first one embeds and
+    writes, the others find the chunks already published and write nothing.
+    """
+    started = time.monotonic()
+    wanted = {}
+    for doc in docs:
+        wanted.setdefault(chunk_id(doc), doc)
+
+    exclusive = getattr(vectorstore, "exclusive", None)
+    with exclusive() if exclusive is not None else contextlib.nullcontext():
+        stored = set(vectorstore.get(include=[])["ids"])
+
+        new_ids = [doc_id for doc_id in wanted if doc_id not in stored]
+        vanished_ids = [doc_id for doc_id in stored if doc_id not in wanted]
+
+        # New chunks go in before vanished ones go out, so a live index never has a gap
+        if new_ids:
+            add_in_batches(vectorstore, [wanted[doc_id] for doc_id in new_ids], new_ids,
+                           batch_size=batch_size, concurrency=concurrency, retries=retries)
+        if vanished_ids:
+            vectorstore.delete(ids=vanished_ids)
+
+    # Changes whenever the set of indexed chunks changes
+    version = hashlib.sha256("\n".join(sorted(wanted)).encode("utf-8")).hexdigest()[:16]
+    seconds = time.monotonic() - started
+
+    return {
+        "version": version,
+        "chunks": len(wanted),
+        "embedded": len(new_ids),
+        "deleted": len(vanished_ids),
+        "unchanged": len(wanted) - len(new_ids),
+        "seconds": round(seconds, 3),
+        "embedded_per_sec": round(len(new_ids) / seconds, 1) if new_ids and seconds else None,
+    }
+
+
+def open_chroma_index(docs: List, embeddings, persist_directory: str,
+                      collection_name: str = DEFAULT_COLLECTION, **sync_options):
+    """Open the persisted Chroma collection, sync it with docs; return (store, stats)"""
+    from langchain_community.vectorstores import Chroma
+
+    vectorstore = Chroma(
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        persist_directory=persist_directory
+    )
+    stats = sync_vectorstore(vectorstore, docs, **sync_options)
+    report_sync(stats)
+    return vectorstore, stats
+
+
+def open_numpy_index(docs: List, embeddings, persist_directory: str, **sync_options):
+    """Open the memory-mapped NumPy index, sync it with docs; return (store, stats)"""
+    from vector_store import NumpyVectorStore
+
+    vectorstore = NumpyVectorStore(embeddings, persist_directory=persist_directory)
+    stats = sync_vectorstore(vectorstore, docs, **sync_options)
+    report_sync(stats)
+    return vectorstore, stats
+
+
+def make_embeddings(backend: str, google_api_key: str = None):
+    """Embeddings for a backend name ("google", "local" or "fake") and the collection they belong to"""
+    if backend in ("local", "fake"):
+        if backend == "fake":
+            from fake_gemini import FakeEmbeddings
+            embeddings = FakeEmbeddings()
+        else:
+            from local_embeddings import HashingEmbeddings
+            embeddings = HashingEmbeddings()
+        # Vectors of different backends must not share a collection
+        return embeddings, f"knowledge_{embeddings.model_name}"
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    embeddings = GoogleGenerativeAIEmbeddings(
+        model="models/embedding-001",
+        google_api_key=google_api_key
+    )
+    return embeddings, DEFAULT_COLLECTION
+
+
+def open_index(docs: List, embeddings, store: str, collection_name: str = DEFAULT_COLLECTION, **sync_options):
+    """Open the configured vector store ("numpy" or "chroma") in its default location"""
+    if store == "numpy":
+        return open_numpy_index(docs, embeddings, f"./vector_index/{collection_name}", **sync_options)
+    return open_chroma_index(docs, embeddings, "./chroma_db", collection_name, **sync_options)
+
+
+def report_sync(stats: dict):
+    print(f"📚 Index sync: {stats['chunks']} chunks, {stats['embedded']} embedded, "
+          f"{stats['deleted']} deleted, {stats['unchanged']} unchanged in {stats['seconds']}s")
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # The module constants were read before .env was loaded, so re-read them here
+    parser = argparse.ArgumentParser(description="Chunk and index the knowledge directory")
+    parser.add_argument("--root", default=os.getenv("KNOWLEDGE_DIR", KNOWLEDGE_DIR), help="knowledge directory")
+    parser.add_argument("--store", default=os.getenv("VECTOR_STORE", "chroma").lower(), choices=["chroma", "numpy"])
+    parser.add_argument("--embeddings", default=os.getenv("EMBEDDINGS_BACKEND", "google").lower(),
+                        choices=["google", "local", "fake"])
+    parser.add_argument("--workers", type=int, default=os.getenv("INGEST_WORKERS", INGEST_WORKERS),
+                        help="chunking processes")
+    parser.add_argument("--batch-size", type=int, default=os.getenv("EMBED_BATCH_SIZE", EMBED_BATCH_SIZE),
+                        help="chunks per embedding call")
+    parser.add_argument("--concurrency", type=int, default=os.getenv("EMBED_CONCURRENCY", EMBED_CONCURRENCY),
+                        help="embedding calls in flight")
+    parser.add_argument("--retries", type=int, default=os.getenv("EMBED_RETRIES", EMBED_RETRIES))
+    parser.add_argument("--json", help="write the stats to this file")
+    args = parser.parse_args()
+
+    embeddings, collection_name = make_embeddings(args.embeddings, os.getenv("GOOGLE_API_KEY"))
+    docs, load_stats = load_knowledge_dir(args.root, workers=args.workers)
+
+    started = time.monotonic()
+    _, sync_stats = open_index(docs, embeddings, args.store, collection_name, batch_size=args.batch_size,
+                               concurrency=args.concurrency, retries=args.retries)
+    total = load_stats["seconds"] + (time.monotonic() - started)
+
+    summary = {
+        "load": load_stats,
+        "sync": sync_stats,
+        "total_seconds": round(total, 3),
+        "docs_per_sec": round(load_stats["files"] / total, 1) if total else None,
+        "chunks_per_sec": round(load_stats["chunks"] / total, 1) if total else None,
+    }
+    print(f"✅ Ingested {load_stats['files']} files / {load_stats['chunks']} chunks in {summary['total_seconds']}s "
+          f"({summary['docs_per_sec']} docs/s, {summary['chunks_per_sec']} chunks/s)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
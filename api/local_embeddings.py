@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline embeddings for the knowledge base retriever.
+
+Texts are turned into fixed-size vectors with signed feature hashing of
+words and character n-grams (sublinear term frequency, L2-normalized).
+Character n-grams make "презентацию" and "презентации" close without a
+stemmer. No model download and no network calls are needed, so queries
+are embedded in well under a millisecond and retrieval keeps working when
+the Google API is unreachable.
+"""
+
+import math
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """LangChain-compatible embeddings computed locally with NumPy"""
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM, ngram_range: Tuple[int, int] = (3, 5),
+                 word_weight: float = 1.0):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.word_weight = word_weight
+
+    @property
+    def model_name(self) -> str:
+        low, high = self.ngram_range
+        return f"local-hash-{self.dim}-{low}{high}"
+
+    def _features(self, text: str) -> Dict[str, float]:
+        counts = defaultdict(float)
+        low, high = self.ngram_range
+        for word in WORD_RE.findall(text.lower()):
+            counts["w:" + word] += self.word_weight
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                for start in range(len(padded) - n + 1):
+                    counts[padded[start:start + n]] += 1.0
+        return counts
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[(h & 0x7FFFFFFF) % self.dim] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a (len(texts), dim) float32 matrix"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self._vector(text)
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text).tolist()
@@ -3,21 +3,29 @@
 
 import os
 import json
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
-# LangChain imports
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-
-# Load environment variables
+# Load environment variables before the local modules read their settings
 load_dotenv()
 
+from admin import require_admin
+from hot_reload import Reloader, files_signature
+from metrics import install_metrics, record_advice, record_parse_failure, register_gauges, stage
+from profiling import install_profiling
+
+# Cold start is measured from here to the end of warm_up()
+PROCESS_START = time.monotonic()
+
 # Initialize FastAPI app
 app = FastAPI(title="Female Task Planner API", version="1.0.0")
 
@@ -30,41 +38,171 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics at /metrics
+install_metrics(app)
+
+# On-demand profiling (X-Profile header or /admin/profiling)
+install_profiling(app)
+
 # Configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 MODEL_ID = "gemini-1.5-flash"
 
-if not GOOGLE_API_KEY:
+# "google" - Gemini embedding API, "local" - offline hashed n-gram embeddings
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "google").lower()
+
+# "chroma" - Chroma/SQLite, "numpy" - memory-mapped .npy matrix (small corpora)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+
+# "gemini" - Google API, "fake" - offline stand-in for chat and embeddings (see fake_gemini.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+if not GOOGLE_API_KEY and LLM_BACKEND != "fake":
     raise ValueError("GOOGLE_API_KEY not found! Please check your .env file")
 
-# Initialize AI client
-client = ChatGoogleGenerativeAI(
-    model=MODEL_ID,
-    google_api_key=GOOGLE_API_KEY,
-    temperature=0.2
-)
+# "dense" - vector search only, "hybrid" - BM25 prefilter with dense rerank
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "dense").lower()
 
-# Initialize embeddings
-embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/embedding-001",
-    google_api_key=GOOGLE_API_KEY
-)
+# Knowledge base: every .md/.txt file under this directory
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", "../Data/Knowledge")
+if not os.path.isdir(KNOWLEDGE_DIR):
+    raise FileNotFoundError(f"Knowledge base directory not found: {KNOWLEDGE_DIR}")
+
+# LangChain, Chroma and the index are heavy, so they are loaded by warm_up()
+# in the background after uvicorn has bound the port. Until then /advice
+# answers with fallback advice and /ready reports 503.
+client = None
+vectorstore = None
+retriever = None
+
+warmup_state = {
+    "ready": False,
+    "stage": "pending",
+    "error": None,
+    "stages": {},
+    "cold_start_seconds": None,
+    "index_version": None,
+}
 
-# Load knowledge base
-DOC_PATH = "../Data/Knowledge/productivity.md"
-if not os.path.isfile(DOC_PATH):
-    raise FileNotFoundError(f"Knowledge base file not found: {DOC_PATH}")
+def warm_up():
+    """Import LangChain, create clients and open the vector index"""
+    global client, vectorstore, retriever
 
-# Load and process documents
-loader = TextLoader(DOC_PATH, encoding="utf-8")
-documents = loader.load()
+    def _set_stage(name: str, started: float):
+        warmup_state["stages"][name] = round(time.monotonic() - started, 3)
 
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-docs = text_splitter.split_documents(documents)
+    started = time.monotonic()
+    warmup_state["stage"] = "imports"
+    from cached_retriever import CachingRetriever
+    from ingest import load_knowledge_dir, make_embeddings, open_index
+    _set_stage("imports", started)
+
+    # Initialize AI client and embeddings
+    started = time.monotonic()
+    warmup_state["stage"] = "clients"
+    if LLM_BACKEND == "fake":
+        from fake_gemini import FakeChatModel
+        chat_client = FakeChatModel(MODEL_ID)
+        # Local embeddings stay local; Google ones are replaced by the fake API
+        embeddings, collection_name = make_embeddings("fake" if EMBEDDINGS_BACKEND == "google" else EMBEDDINGS_BACKEND)
+    else:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        chat_client = ChatGoogleGenerativeAI(
+            model=MODEL_ID,
+            google_api_key=GOOGLE_API_KEY,
+            temperature=0.2
+        )
+        embeddings, collection_name = make_embeddings(EMBEDDINGS_BACKEND, GOOGLE_API_KEY)
+    _set_stage("clients", started)
+
+    # Load and process documents
+    started = time.monotonic()
+    warmup_state["stage"] = "documents"
+    # Chunks follow the markdown headings and are tagged with their cycle phase
+    docs, _ = load_knowledge_dir(KNOWLEDGE_DIR)
+    _set_stage("documents", started)
+
+    # Open the persisted vector store, embedding only new or changed chunks
+    started = time.monotonic()
+    warmup_state["stage"] = "index"
+    store, sync_stats = open_index(docs, embeddings, VECTOR_STORE, collection_name)
+    _set_stage("index", started)
+
+    client = chat_client
+    vectorstore = store
+    warmup_state["index_version"] = sync_stats["version"]
+    # Repeated tasks skip both the query embedding and the vector scan
+    if RETRIEVER_MODE == "hybrid":
+        from hybrid_retriever import HybridRetriever
+        retriever = HybridRetriever(vectorstore=store, version_fn=lambda: warmup_state["index_version"])
+    else:
+        retriever = CachingRetriever(vectorstore=store, version_fn=lambda: warmup_state["index_version"])
 
-# Create vector store
-vectorstore = Chroma.from_documents(docs, embeddings, persist_directory="./chroma_db")
-retriever = vectorstore.as_retriever()
+def reload_index():
+    """Re-chunk the knowledge directory and sync the live vector store.
+
+    The store keeps serving during the sync; bumping index_version afterwards
+    drops the retriever's cached results of the previous version. Every worker
+    runs this on the same edit: with the numpy store the sync takes the index
+    directory lock, so only the first worker embeds and writes, and the others
+    just pick up the generation it published.
+    """
+    from ingest import load_knowledge_dir, report_sync, sync_vectorstore
+    docs, _ = load_knowledge_dir(KNOWLEDGE_DIR)
+    sync_stats = sync_vectorstore(vectorstore, docs)
+    report_sync(sync_stats)
+    warmup_state["index_version"] = sync_stats["version"]
+
+def knowledge_signature():
+    from ingest import iter_knowledge_files
+    return files_signature(iter_knowledge_files(KNOWLEDGE_DIR))
+
+index_reloader = Reloader(reload_index, signature=knowledge_signature)
+
+register_gauges("warmup", lambda: {
+    "ready": int(warmup_state["ready"]),
+    "cold_start_seconds": warmup_state["cold_start_seconds"],
+})
+register_gauges("retrieval", lambda: retriever.stats() if retriever is not None else {})
+
+def run_warm_up():
+    try:
+        warm_up()
+        warmup_state["stage"] = "ready"
+        warmup_state["ready"] = True
+        # Edits under KNOWLEDGE_DIR are picked up without a restart
+        index_reloader.start_watching()
+    except Exception as e:
+        print(f"❌ Warm-up failed: {e}")
+        warmup_state["stage"] = "failed"
+        warmup_state["error"] = str(e)
+    warmup_state["cold_start_seconds"] = round(time.monotonic() - PROCESS_START, 3)
+    print(f"⏱️  Cold start: {warmup_state['cold_start_seconds']}s ({warmup_state['stage']})")
+
+@app.on_event("startup")
+async def start_warm_up():
+    threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
+
+# Vector queries are blocking, so they run on a dedicated executor
+# instead of tying up the event loop or Starlette's shared threadpool
+RETRIEVER_WORKERS = int(os.getenv("RETRIEVER_WORKERS", "8"))
+retriever_executor = ThreadPoolExecutor(max_workers=RETRIEVER_WORKERS, thread_name_prefix="retriever")
+
+# Upper bound on outstanding Gemini calls per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Upper bound on knowledge base tokens pasted into one prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+
+# Fallback advice per phase: (verdict, reason, suggestion)
+FALLBACK_ADVICE = {
+    "menstruation": ("avoid", "низкая энергия", "перенеси или упрости задачу"),
+    "follicular": ("good", "хорошее время для старта", "запланируй первые шаги"),
+    "ovulation": ("good", "пик коммуникаций", "назначь встречи/презентации"),
+    "luteal": ("ok", "фокус и завершение", "разбей на подзадачи"),
+    "unknown": ("ok", "недостаточно данных", "ориентируйся на самочувствие"),
+}
 
 # Pydantic models
 class AdviceIn(BaseModel):
@@ -78,9 +216,29 @@ class AdviceOut(BaseModel):
     suggestion: str
 
 # Helper functions
-def docs_to_context(docs):
-    """Convert retrieved documents to context string"""
-    return "\n".join([doc.page_content for doc in docs])
+async def retrieve_documents(query: str, phase: Optional[str] = None):
+    """Run the blocking retriever on the dedicated executor"""
+    loop = asyncio.get_running_loop()
+    with stage("retrieval"):
+        return await loop.run_in_executor(retriever_executor, partial(retriever.invoke, query, phase=phase))
+
+def fallback_advice(phase: str) -> AdviceOut:
+    """Static advice used when the model or the index is unavailable"""
+    record_advice("fallback")
+    v, r, s = FALLBACK_ADVICE.get(phase, FALLBACK_ADVICE["unknown"])
+    return AdviceOut(verdict=v, reason=r, suggestion=s)
+
+def docs_to_context(docs, budget: int = CONTEXT_TOKEN_BUDGET):
+    """Convert retrieved documents to context string, best first, within the token budget"""
+    from md_chunker import estimate_tokens
+    parts, used = [], 0
+    for doc in docs:
+        tokens = doc.metadata.get("tokens") or estimate_tokens(doc.page_content)
+        if parts and used + tokens > budget:
+            break
+        parts.append(doc.page_content)
+        used += tokens
+    return "\n\n".join(parts)
 
 def pick_system(locale: str) -> str:
     """Select system prompt based on locale"""
@@ -114,24 +272,37 @@ Analyze this task considering the menstrual cycle phase and give advice."""
 
 # API endpoints
 @app.post("/advice", response_model=AdviceOut)
-def advice(payload: AdviceIn):
+async def advice(payload: AdviceIn):
+    if not warmup_state["ready"]:
+        # Still warming up (or warm-up failed): answer without the model
+        return fallback_advice(payload.phase)
     try:
         # Get relevant context from knowledge base
-        ctx = docs_to_context(retriever.get_relevant_documents(payload.task))
+        docs = await retrieve_documents(payload.task, payload.phase)
+        with stage("prompt"):
+            ctx = docs_to_context(docs)
+            messages = [
+                {"role": "system", "content": pick_system(payload.locale)},
+                {"role": "user", "content": build_user_prompt(payload.phase, payload.task, payload.locale, ctx)}
+            ]
         
         # Generate AI response
-        resp = client.invoke([
-            {"role": "system", "content": pick_system(payload.locale)},
-            {"role": "user", "content": build_user_prompt(payload.phase, payload.task, payload.locale, ctx)}
-        ])
+        async with llm_semaphore:
+            with stage("llm"):
+                resp = await client.ainvoke(messages)
         
         # Parse response
         raw = resp.content
         try:
-            obj = json.loads(raw)
+            with stage("parse"):
+                obj = json.loads(raw)
+            if not isinstance(obj, dict):
+                # Valid JSON but not an advice object (e.g. an array)
+                raise json.JSONDecodeError("expected a JSON object", raw, 0)
             v = obj.get("verdict", "ok")
             if v not in ("good", "ok", "avoid"): 
                 v = "ok"
+            record_advice("llm")
             return AdviceOut(
                 verdict=v, 
                 reason=obj.get("reason", ""), 
@@ -139,33 +310,43 @@ def advice(payload: AdviceIn):
             )
         except json.JSONDecodeError:
             # Fallback if JSON parsing fails
-            fallback = {
-                "menstruation": ("avoid", "низкая энергия", "перенеси или упрости задачу"),
-                "follicular": ("good", "хорошее время для старта", "запланируй первые шаги"),
-                "ovulation": ("good", "пик коммуникаций", "назначь встречи/презентации"),
-                "luteal": ("ok", "фокус и завершение", "разбей на подзадачи"),
-                "unknown": ("ok", "недостаточно данных", "ориентируйся на самочувствие"),
-            }
-            v, r, s = fallback.get(payload.phase, fallback["unknown"])
-            return AdviceOut(verdict=v, reason=r, suggestion=s)
+            record_parse_failure("single")
+            return fallback_advice(payload.phase)
             
     except Exception as e:
         print(f"Error in advice endpoint: {e}")
         # Return fallback response
-        fallback = {
-            "menstruation": ("avoid", "низкая энергия", "перенеси или упрости задачу"),
-            "follicular": ("good", "хорошее время для старта", "запланируй первые шаги"),
-            "ovulation": ("good", "пик коммуникаций", "назначь встречи/презентации"),
-            "luteal": ("ok", "фокус и завершение", "разбей на подзадачи"),
-            "unknown": ("ok", "недостаточно данных", "ориентируйся на самочувствие"),
-        }
-        v, r, s = fallback.get(payload.phase, fallback["unknown"])
-        return AdviceOut(verdict=v, reason=r, suggestion=s)
+        return fallback_advice(payload.phase)
 
 @app.get("/health")
 def health():
     return {"status": "ok", "message": "Female Task Planner API is running"}
 
+@app.get("/retrieval/stats")
+def retrieval_stats():
+    """Query-embedding and retrieval result cache counters"""
+    if retriever is None:
+        return {"ready": False}
+    stats = retriever.stats()
+    if hasattr(vectorstore, "partition_sizes"):
+        stats["partitions"] = vectorstore.partition_sizes()
+    stats["reload"] = index_reloader.stats()
+    return stats
+
+@app.post("/admin/reload", status_code=202, dependencies=[Depends(require_admin)])
+def admin_reload():
+    """Re-ingest the knowledge directory in the background (X-Admin-Token required)"""
+    if not warmup_state["ready"]:
+        raise HTTPException(status_code=409, detail="Index is not ready yet")
+    started = index_reloader.trigger("admin")
+    return {"status": "started" if started else "queued", "index_version": warmup_state["index_version"]}
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once warm-up is done, 503 with progress before that"""
+    status_code = 200 if warmup_state["ready"] else 503
+    return JSONResponse(status_code=status_code, content=warmup_state)
+
 @app.get("/")
 def root():
     return {"message": "Female Task Planner API", "version": "1.0.0"}
@@ -3,16 +3,32 @@
 
 import os
 import json
+import asyncio
 from typing import Optional, List
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import google.generativeai as genai
 
-# Load environment variables
+# Load environment variables before the local modules read their settings
 load_dotenv()
 
+from admin import require_admin
+from advice_batch import (
+    BATCH_GENERATION_CONFIG, MAX_BATCH_ITEMS, extract_json_text, group_for_prompts, parse_batch_answers
+)
+from advice_cache import AdviceCache, make_cache_key
+from advice_stream import SSE_HEADERS, FieldStreamer, sse_event
+from hot_reload import Reloader, files_signature
+from metrics import install_metrics, record_advice, record_parse_failure, register_cache, register_gauges, stage
+from micro_batch import MICRO_BATCH_ENABLED, MicroBatcher
+from profiling import install_profiling
+from rag_index import KnowledgeSnapshot
+from resilience import ADVICE_DEADLINE_SECONDS, CircuitBreaker, call_with_deadline
+from single_flight import SingleFlight
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Female Task Planner RAG API", 
@@ -29,10 +45,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics at /metrics
+install_metrics(app)
+
+# On-demand profiling (X-Profile header or /admin/profiling)
+install_profiling(app)
+
 # Configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not GOOGLE_API_KEY:
+# "gemini" - Google API, "fake" - offline stand-in (see fake_gemini.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+if LLM_BACKEND == "fake":
+    from fake_gemini import FakeGenerativeModel
+    model = FakeGenerativeModel('gemini-1.5-flash')
+    print("🧪 Using the offline fake Gemini backend")
+elif not GOOGLE_API_KEY:
     print("⚠️  GOOGLE_API_KEY not found! Using fallback mode.")
     model = None
 else:
@@ -44,6 +73,28 @@ else:
         print(f"⚠️  Error configuring Gemini: {e}")
         model = None
 
+# Upper bound on outstanding Gemini calls per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Cache of generated advice (size and TTL come from ADVICE_CACHE_SIZE / ADVICE_CACHE_TTL)
+advice_cache = AdviceCache()
+
+# Stops calling Gemini after repeated timeouts/errors until a probe succeeds
+llm_breaker = CircuitBreaker()
+
+# Identical requests that arrive while a call is pending share its result
+advice_flights = SingleFlight()
+
+register_cache("advice", advice_cache.stats)
+register_gauges("single_flight", advice_flights.stats)
+
+def llm_circuit_gauges() -> dict:
+    stats = llm_breaker.stats()
+    return {**stats, "open": int(stats["state"] == "open")}
+
+register_gauges("llm_circuit", llm_circuit_gauges)
+
 # Pydantic models
 class AdviceIn(BaseModel):
     task: str
@@ -57,9 +108,14 @@ class AdviceOut(BaseModel):
     confidence: float = 0.0
     source: str = "fallback"
 
+class AdviceBatchIn(BaseModel):
+    items: List[AdviceIn]
+
 class DocumentSearch(BaseModel):
     query: str
     limit: int = 3
+    offset: int = 0
+    phases: Optional[List[str]] = None  # None - search across all phases
 
 class DocumentOut(BaseModel):
     content: str
@@ -191,56 +247,124 @@ RAG_KNOWLEDGE_BASE = {
     }
 }
 
-def search_knowledge_base(query: str, phase: str, limit: int = 3) -> List[dict]:
-    """RAG: Retrieve relevant information from knowledge base"""
-    phase_data = RAG_KNOWLEDGE_BASE.get(phase, {})
-    
-    # Simple keyword-based retrieval
-    query_lower = query.lower()
-    results = []
-    
-    # Search in different sections
-    for section, content in phase_data.items():
-        if isinstance(content, dict):
-            for key, value in content.items():
-                if isinstance(value, list):
-                    for item in value:
-                        if any(word in item.lower() for word in query_lower.split()):
-                            results.append({
-                                "content": item,
-                                "section": section,
-                                "key": key,
-                                "relevance_score": 0.8
-                            })
-                elif isinstance(value, str) and any(word in value.lower() for word in query_lower.split()):
-                    results.append({
-                        "content": value,
-                        "section": section,
-                        "key": key,
-                        "relevance_score": 0.9
-                    })
-    
-    # Sort by relevance and return top results
-    results.sort(key=lambda x: x["relevance_score"], reverse=True)
-    return results[:limit]
+# Optional JSON file with the same structure that replaces the built-in
+# knowledge base above and is reloaded whenever it changes
+RAG_KB_PATH = os.getenv("RAG_KB_PATH")
+
+def load_knowledge_base() -> dict:
+    """Knowledge base from RAG_KB_PATH, or the built-in one"""
+    if not RAG_KB_PATH:
+        return RAG_KNOWLEDGE_BASE
+    with open(RAG_KB_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+# Knowledge base and its inverted index. A reload builds a new snapshot and
+# swaps this reference; requests read it once and keep their snapshot.
+try:
+    kb_state = KnowledgeSnapshot(load_knowledge_base())
+except (OSError, ValueError) as e:
+    print(f"⚠️  Could not load {RAG_KB_PATH}: {e}. Using the built-in knowledge base.")
+    kb_state = KnowledgeSnapshot(RAG_KNOWLEDGE_BASE)
+
+def reload_knowledge_base():
+    """Rebuild the snapshot, swap it in and drop cached advice of changed phases"""
+    global kb_state
+    old = kb_state
+    new = KnowledgeSnapshot(load_knowledge_base(), version=old.version + 1)
+    kb_state = new
+    dropped = advice_cache.invalidate_tags(old.changed_tags(new))
+    print(f"📚 Knowledge base v{new.version}: {dropped} cached answers invalidated")
+
+kb_reloader = Reloader(
+    reload_knowledge_base,
+    signature=(lambda: files_signature([RAG_KB_PATH])) if RAG_KB_PATH else None
+)
+
+@app.on_event("startup")
+async def start_kb_watcher():
+    kb_reloader.start_watching()
+
+# Special phase value for a global search over all phases
+ALL_PHASES = "all"
+MAX_SEARCH_RESULTS = 50
 
-def generate_rag_advice(task: str, phase: str, locale: str) -> dict:
+def search_knowledge_base(query: str, phase, limit: int = 3, offset: int = 0,
+                          state: KnowledgeSnapshot = None) -> List[dict]:
+    """RAG: Retrieve relevant information from knowledge base (BM25 ranking)
+
+    phase is a phase name, a list of phase names or "all". The advice paths
+    time it as their "retrieval" stage; plain /search requests are not staged.
+    """
+    state = state or kb_state
+    phases = None if phase == ALL_PHASES else phase
+    return state.index.search(query, phases, limit, offset)
+
+def format_retrieved_docs(retrieved_docs: List[dict]) -> str:
+    """Render retrieved documents as a numbered prompt section"""
+    context = "Ретривленная информация:\n"
+    for i, doc in enumerate(retrieved_docs, 1):
+        context += f"{i}. {doc['content']} (из {doc['section']})\n"
+    return context
+
+async def generate_rag_advice(task: str, phase: str, locale: str) -> dict:
     """RAG: Generate advice using retrieved context"""
+    # Step 0: Serve repeated requests from the cache
+    state = kb_state
+    cache_key = make_cache_key(task, phase, locale)
+    with stage("cache"):
+        cached = advice_cache.get(cache_key, tag=state.tag(phase))
+    if cached is not None:
+        record_advice("cache")
+        return cached
+
+    return await advice_flights.do(
+        (cache_key, state.version),
+        lambda: generate_rag_advice_uncached(task, phase, locale, cache_key, state)
+    )
+
+async def generate_rag_advice_uncached(task: str, phase: str, locale: str, cache_key: tuple,
+                                       state: KnowledgeSnapshot) -> dict:
+    """RAG: Retrieval and generation behind the cache and single-flight layers"""
     # Step 1: Retrieve relevant information
-    retrieved_docs = search_knowledge_base(task, phase, limit=3)
+    with stage("retrieval"):
+        retrieved_docs = search_knowledge_base(task, phase, limit=3, state=state)
+    
+    # Skip the model entirely without a key or while the circuit is open
+    if model is None or not llm_breaker.allow_request():
+        return generate_fallback_advice(task, phase, locale, retrieved_docs)
     
-    # Step 2: Build context from retrieved documents
+    # Under load, concurrent requests of the same phase share one prompt
+    if advice_batcher is not None:
+        llm_call = advice_batcher.submit((task, phase, locale, retrieved_docs, state))
+    else:
+        llm_call = call_rag_model(task, phase, retrieved_docs, cache_key, state.tag(phase))
+    
+    # Step 2: Wait for the model within the latency budget. On timeout the
+    # fallback is returned and a late answer still fills the cache.
+    try:
+        advice_data = await call_with_deadline(
+            llm_call, ADVICE_DEADLINE_SECONDS, llm_breaker,
+            lambda: generate_fallback_advice(task, phase, locale, retrieved_docs)
+        )
+    except Exception as e:
+        print(f"RAG AI Error: {e}")
+        return generate_fallback_advice(task, phase, locale, retrieved_docs)
+    
+    # Step 3: Count the source once, for the answer this request actually gets
+    if advice_data is None:
+        # The micro-batch answer omitted or garbled this task
+        return generate_fallback_advice(task, phase, locale, retrieved_docs)
+    if advice_data["source"] == "rag_ai":
+        record_advice("llm")
+    return advice_data
+
+def build_rag_prompt(task: str, phase: str, retrieved_docs: List[dict]) -> str:
+    """RAG: Build the single-task prompt from retrieved documents"""
     context = f"Фаза цикла: {phase}\n"
     context += f"Задача: {task}\n\n"
-    context += "Ретривленная информация:\n"
+    context += format_retrieved_docs(retrieved_docs)
     
-    for i, doc in enumerate(retrieved_docs, 1):
-        context += f"{i}. {doc['content']} (из {doc['section']})\n"
-    
-    # Step 3: Generate advice using AI or fallback
-    if model and GOOGLE_API_KEY:
-        try:
-            prompt = f"""Ты - эксперт по женскому здоровью и менструальному циклу.
+    return f"""Ты - эксперт по женскому здоровью и менструальному циклу.
 
 {context}
 
@@ -249,16 +373,11 @@ def generate_rag_advice(task: str, phase: str, locale: str) -> dict:
 Отвечай в формате JSON:
 {{"verdict": "good/ok/avoid", "reason": "объяснение", "suggestion": "конкретный совет", "confidence": 0.8}}"""
 
-            response = model.generate_content(prompt)
-            text = response.text.strip()
-            
-            # Extract JSON
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(text)
+def parse_rag_answer(text: str) -> dict:
+    """RAG: Turn the model answer (optionally fenced JSON) into advice data"""
+    with stage("parse"):
+        try:
+            result = json.loads(extract_json_text(text))
             return {
                 "verdict": result.get("verdict", "ok"),
                 "reason": result.get("reason", ""),
@@ -266,15 +385,249 @@ def generate_rag_advice(task: str, phase: str, locale: str) -> dict:
                 "confidence": float(result.get("confidence", 0.8)),
                 "source": "rag_ai"
             }
+        except (ValueError, TypeError, AttributeError):
+            record_parse_failure("single")
+            raise
+
+async def call_rag_model(task: str, phase: str, retrieved_docs: List[dict], cache_key: tuple,
+                         tag: tuple = None) -> dict:
+    """RAG: Ask Gemini for advice on one task and cache the answer"""
+    with stage("prompt"):
+        prompt = build_rag_prompt(task, phase, retrieved_docs)
+    async with llm_semaphore:
+        with stage("llm"):
+            response = await model.generate_content_async(prompt)
+    
+    advice_data = parse_rag_answer(response.text)
+    advice_cache.set(cache_key, advice_data, tag=tag)
+    return advice_data
+
+async def stream_rag_advice(task: str, phase: str, locale: str):
+    """RAG: Yield SSE events - retrieved context, text deltas, final verdict"""
+    # Step 1: Retrieval goes out first, before the model is even called
+    state = kb_state
+    with stage("retrieval"):
+        retrieved_docs = search_knowledge_base(task, phase, limit=3, state=state)
+    yield sse_event("context", {"documents": retrieved_docs})
+    
+    cache_key = make_cache_key(task, phase, locale)
+    cached = advice_cache.get(cache_key, tag=state.tag(phase))
+    if cached is not None:
+        record_advice("cache")
+        yield sse_event("done", AdviceOut(**cached).model_dump())
+        return
+    
+    if model is None or not llm_breaker.allow_request():
+        yield sse_event("done", AdviceOut(**generate_fallback_advice(task, phase, locale, retrieved_docs)).model_dump())
+        return
+    
+    # Step 2: Stream the answer and forward reason/suggestion text as it grows
+    text = ""
+    streamer = FieldStreamer()
+    chunks = asyncio.Queue()
+    producer = None
+    try:
+        try:
+            with stage("prompt"):
+                prompt = build_rag_prompt(task, phase, retrieved_docs)
+            producer = asyncio.ensure_future(read_model_stream(prompt, chunks))
+            while (item := await chunks.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                text += item
+                for delta in streamer.feed(text):
+                    yield sse_event("delta", delta)
+            advice_data = parse_rag_answer(text)
+        except Exception:
+            llm_breaker.record_failure()
+            raise
+        except BaseException:
+            # Client disconnected (GeneratorExit / CancelledError): no verdict on
+            # the model, but a half-open probe must not stay in flight forever
+            llm_breaker.release_probe()
+            raise
+        finally:
+            if producer is not None:
+                producer.cancel()
+    except Exception as e:
+        print(f"RAG AI stream error: {e}")
+        yield sse_event("done", AdviceOut(**generate_fallback_advice(task, phase, locale, retrieved_docs)).model_dump())
+        return
+    
+    # Step 3: Final event keeps the AdviceOut contract
+    llm_breaker.record_success()
+    advice_cache.set(cache_key, advice_data, tag=state.tag(phase))
+    record_advice("llm")
+    yield sse_event("done", AdviceOut(**advice_data).model_dump())
+
+async def read_model_stream(prompt: str, chunks: asyncio.Queue):
+    """Read the streamed model answer into a queue: text pieces, then None (or the exception).
+
+    The LLM slot and the llm_stream stage cover only the model call, so a slow
+    client reading the SSE response does not hold either.
+    """
+    try:
+        async with llm_semaphore:
+            with stage("llm_stream"):
+                response = await model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    chunks.put_nowait(chunk.text)
+    except Exception as e:
+        chunks.put_nowait(e)
+        return
+    chunks.put_nowait(None)
+
+def build_batch_prompt(phase: str, tasks: List[str], retrieved: List[List[dict]]) -> str:
+    """Build one prompt that asks for advice on several tasks of the same phase"""
+    sections = []
+    for i, (task, docs) in enumerate(zip(tasks, retrieved), 1):
+        sections.append(f"Задача {i}: {task}\n{format_retrieved_docs(docs)}")
+    tasks_block = "\n".join(sections)
+
+    return f"""Ты - эксперт по женскому здоровью и менструальному циклу.
+
+Фаза цикла: {phase}
+
+{tasks_block}
+На основе ретривленной информации проанализируй каждую задачу и дай персональный совет.
+
+Отвечай JSON-массивом, по одному объекту на каждую задачу, где id - номер задачи:
+[{{"id": 1, "verdict": "good/ok/avoid", "reason": "объяснение", "suggestion": "конкретный совет", "confidence": 0.8}}]"""
+
+async def call_rag_batch_model(phase: str, tasks: List[str], retrieved: List[List[dict]]) -> List[Optional[dict]]:
+    """RAG: One model call for a chunk of tasks; model errors propagate to the caller"""
+    with stage("prompt"):
+        prompt = build_batch_prompt(phase, tasks, retrieved)
+    async with llm_semaphore:
+        with stage("llm"):
+            response = await model.generate_content_async(prompt, generation_config=BATCH_GENERATION_CONFIG)
+    with stage("parse"):
+        answers = parse_batch_answers(response.text, len(tasks))
+    record_parse_failure("batch", answers.count(None))
+    if tasks and answers.count(None) == len(tasks):
+        # Nothing usable came back: count it like an unparsable single answer
+        raise ValueError("no valid answers in the batch response")
+    return answers
+
+def cache_chunk_answers(phase: str, tasks: List[str], locales: List[str], answers: List[Optional[dict]],
+                        state: KnowledgeSnapshot) -> List[Optional[dict]]:
+    """RAG: Cache the model answers of a chunk; None where the model gave no answer.
+
+    Nothing is counted here: the caller records the source of the advice it returns.
+    """
+    results = []
+    for task, locale, answer in zip(tasks, locales, answers):
+        if answer is None:
+            # Model omitted or garbled this entry
+            results.append(None)
+            continue
+        try:
+            confidence = float(answer.get("confidence", 0.8))
+        except (TypeError, ValueError):
+            confidence = 0.8
+        advice_data = {
+            "verdict": answer["verdict"],
+            "reason": answer["reason"],
+            "suggestion": answer["suggestion"],
+            "confidence": confidence,
+            "source": "rag_ai"
+        }
+        advice_cache.set(make_cache_key(task, phase, locale), advice_data, tag=state.tag(phase))
+        results.append(advice_data)
+    return results
+
+async def generate_rag_advice_chunk(phase: str, tasks: List[str], locales: List[str]) -> List[dict]:
+    """RAG: Generate advice for several tasks of one phase with a single model call"""
+    state = kb_state
+    with stage("retrieval"):
+        retrieved = [search_knowledge_base(task, phase, limit=3, state=state) for task in tasks]
+    answers = [None] * len(tasks)
+
+    # The batch endpoint has no deadline wrapper, so it talks to the breaker itself
+    if model is not None and llm_breaker.allow_request():
+        try:
+            answers = await call_rag_batch_model(phase, tasks, retrieved)
+            llm_breaker.record_success()
         except Exception as e:
-            print(f"RAG AI Error: {e}")
-            return generate_fallback_advice(task, phase, locale, retrieved_docs)
-    else:
-        return generate_fallback_advice(task, phase, locale, retrieved_docs)
+            print(f"RAG AI batch error: {e}")
+            llm_breaker.record_failure()
+
+    results = []
+    cached = cache_chunk_answers(phase, tasks, locales, answers, state)
+    for task, locale, docs, advice_data in zip(tasks, locales, retrieved, cached):
+        if advice_data is None:
+            advice_data = generate_fallback_advice(task, phase, locale, docs)
+        else:
+            record_advice("llm")
+        results.append(advice_data)
+    return results
+
+async def generate_rag_advice_batch(items: List[AdviceIn]) -> List[dict]:
+    """RAG: Generate advice for many tasks, packing them into as few prompts as possible"""
+    results = [None] * len(items)
+    state = kb_state
+
+    # Step 1: Serve cached items and collapse duplicates within the batch
+    pending = {}
+    for index, item in enumerate(items):
+        cache_key = make_cache_key(item.task, item.phase, item.locale)
+        if cache_key in pending:
+            pending[cache_key].append(index)
+            continue
+        cached = advice_cache.get(cache_key, tag=state.tag(item.phase))
+        if cached is not None:
+            record_advice("cache")
+            results[index] = cached
+        else:
+            pending[cache_key] = [index]
+
+    # Step 2: One prompt per phase chunk, all chunks in parallel
+    unique = [items[indices[0]] for indices in pending.values()]
+    chunks = group_for_prompts(unique, lambda item: item.phase)
+    chunk_results = await asyncio.gather(*[
+        generate_rag_advice_chunk(
+            unique[chunk[0]].phase,
+            [unique[i].task for i in chunk],
+            [unique[i].locale for i in chunk]
+        )
+        for chunk in chunks
+    ])
+
+    # Step 3: Fan results back out in the original order
+    owners = list(pending.values())
+    for chunk, advice_list in zip(chunks, chunk_results):
+        for unique_index, advice_data in zip(chunk, advice_list):
+            for index in owners[unique_index]:
+                results[index] = dict(advice_data)
+    return results
+
+async def run_advice_micro_batch(items: List[tuple]) -> List[dict]:
+    """Micro-batch callback: all items share one phase and knowledge snapshot
+    and bring the documents already retrieved for them.
+
+    Model errors are raised to every waiting request, so each call_with_deadline
+    records them in the breaker just like a failed single call. Tasks the model
+    left out come back as None for the caller to replace with a fallback.
+    """
+    _, phase, _, _, state = items[0]
+    tasks = [item[0] for item in items]
+    locales = [item[2] for item in items]
+    retrieved = [item[3] for item in items]
+    answers = await call_rag_batch_model(phase, tasks, retrieved)
+    return cache_chunk_answers(phase, tasks, locales, answers, state)
+
+# Opt-in aggregation of concurrent single /advice requests (ADVICE_MICRO_BATCH=1);
+# a batch never mixes phases or knowledge snapshots
+advice_batcher = MicroBatcher(
+    run_advice_micro_batch, group_key=lambda item: (item[1], item[4].version)
+) if MICRO_BATCH_ENABLED else None
+if advice_batcher is not None:
+    register_gauges("micro_batch", advice_batcher.stats)
 
 def generate_fallback_advice(task: str, phase: str, locale: str, retrieved_docs: List[dict] = None) -> dict:
     """Fallback advice generation using retrieved context"""
-    phase_data = RAG_KNOWLEDGE_BASE.get(phase, {})
+    record_advice("fallback")
+    phase_data = kb_state.knowledge_base.get(phase, {})
     task_recommendations = phase_data.get("task_recommendations", {})
     
     # Simple keyword matching for verdict
@@ -310,21 +663,57 @@ def generate_fallback_advice(task: str, phase: str, locale: str, retrieved_docs:
 
 # API endpoints
 @app.post("/advice", response_model=AdviceOut)
-def advice(payload: AdviceIn):
+async def advice(payload: AdviceIn):
     """RAG-powered advice endpoint"""
     try:
-        advice_data = generate_rag_advice(payload.task, payload.phase, payload.locale)
+        advice_data = await generate_rag_advice(payload.task, payload.phase, payload.locale)
         return AdviceOut(**advice_data)
     except Exception as e:
         print(f"Error in advice endpoint: {e}")
         fallback = generate_fallback_advice(payload.task, payload.phase, payload.locale)
         return AdviceOut(**fallback)
 
+@app.post("/advice/stream")
+async def advice_stream(payload: AdviceIn):
+    """RAG-powered advice as Server-Sent Events (context, delta..., done)"""
+    return StreamingResponse(
+        stream_rag_advice(payload.task, payload.phase, payload.locale),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.post("/advice/batch", response_model=List[AdviceOut])
+async def advice_batch(payload: AdviceBatchIn):
+    """RAG-powered advice for a list of tasks, results in the original order"""
+    if len(payload.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {MAX_BATCH_ITEMS})")
+    try:
+        advice_list = await generate_rag_advice_batch(payload.items)
+    except Exception as e:
+        print(f"Error in batch advice endpoint: {e}")
+        advice_list = [generate_fallback_advice(item.task, item.phase, item.locale) for item in payload.items]
+    return [AdviceOut(**advice_data) for advice_data in advice_list]
+
 @app.post("/search", response_model=List[DocumentOut])
 def search_documents(payload: DocumentSearch):
-    """RAG: Search knowledge base"""
-    results = search_knowledge_base(payload.query, "all", payload.limit)
-    return [DocumentOut(**doc) for doc in results]
+    """RAG: Search knowledge base across all phases or the selected ones"""
+    phases = payload.phases or ALL_PHASES
+    if payload.phases:
+        unknown = [phase for phase in payload.phases if phase not in kb_state.knowledge_base]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown phases: {', '.join(unknown)}")
+
+    limit = max(0, min(payload.limit, MAX_SEARCH_RESULTS))
+    offset = max(0, min(payload.offset, MAX_SEARCH_RESULTS))
+    results = search_knowledge_base(payload.query, phases, limit, offset)
+    return [
+        DocumentOut(
+            content=doc["content"],
+            relevance_score=doc["relevance_score"],
+            source=f"{doc['phase']}/{doc['section']}"
+        )
+        for doc in results
+    ]
 
 @app.get("/health")
 def health():
@@ -332,9 +721,28 @@ def health():
         "status": "ok", 
         "message": "Female Task Planner RAG API is running",
         "rag_enabled": True,
-        "ai_available": model is not None
+        "ai_available": model is not None,
+        "llm_circuit": llm_breaker.stats(),
+        "knowledge_version": kb_state.version,
+        "knowledge_reload": kb_reloader.stats()
     }
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Advice cache size, hit/miss counters and coalesced requests"""
+    return {**advice_cache.stats(), "single_flight": advice_flights.stats()}
+
+@app.get("/batching/stats")
+def batching_stats():
+    """Micro-batching counters"""
+    return advice_batcher.stats() if advice_batcher else {"enabled": False}
+
+@app.post("/admin/reload", status_code=202, dependencies=[Depends(require_admin)])
+def admin_reload():
+    """Rebuild the knowledge base index in the background (X-Admin-Token required)"""
+    started = kb_reloader.trigger("admin")
+    return {"status": "started" if started else "queued", "knowledge_version": kb_state.version}
+
 @app.get("/")
 def root():
     return {
@@ -346,14 +754,15 @@ def root():
 @app.get("/phases")
 def get_phases():
     """Get all cycle phases with detailed information"""
-    return {"phases": RAG_KNOWLEDGE_BASE}
+    return {"phases": kb_state.knowledge_base}
 
 @app.get("/phases/{phase}")
 def get_phase_details(phase: str):
     """Get detailed information about specific phase"""
-    if phase not in RAG_KNOWLEDGE_BASE:
+    knowledge_base = kb_state.knowledge_base
+    if phase not in knowledge_base:
         raise HTTPException(status_code=404, detail="Phase not found")
-    return {"phase": phase, "data": RAG_KNOWLEDGE_BASE[phase]}
+    return {"phase": phase, "data": knowledge_base[phase]}
 
 if __name__ == "__main__":
     import uvicorn
@@ -3,16 +3,24 @@
 
 import os
 import json
-from typing import Optional
+import asyncio
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import google.generativeai as genai
 
-# Load environment variables
+# Load environment variables before the local modules read their settings
 load_dotenv()
 
+from advice_batch import BATCH_GENERATION_CONFIG, extract_json_text, parse_batch_answers
+from advice_cache import AdviceCache, make_cache_key
+from metrics import install_metrics, record_advice, record_parse_failure, register_cache, register_gauges, stage
+from micro_batch import MICRO_BATCH_ENABLED, MicroBatcher
+from profiling import install_profiling
+from single_flight import SingleFlight
+
 # Initialize FastAPI app
 app = FastAPI(title="Female Task Planner API", version="1.0.0")
 
@@ -25,15 +33,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics at /metrics
+install_metrics(app)
+
+# On-demand profiling (X-Profile header or /admin/profiling)
+install_profiling(app)
+
 # Configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not found! Please check your .env file")
+# "gemini" - Google API, "fake" - offline stand-in (see fake_gemini.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+if LLM_BACKEND == "fake":
+    from fake_gemini import FakeGenerativeModel
+    model = FakeGenerativeModel('gemini-1.5-flash')
+    print("🧪 Using the offline fake Gemini backend")
+else:
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY not found! Please check your .env file")
+
+    # Configure Gemini
+    genai.configure(api_key=GOOGLE_API_KEY)
+    model = genai.GenerativeModel('gemini-1.5-flash')
 
-# Configure Gemini
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
+# Upper bound on outstanding Gemini calls per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Cache of generated advice (size and TTL come from ADVICE_CACHE_SIZE / ADVICE_CACHE_TTL)
+advice_cache = AdviceCache()
+
+# Identical requests that arrive while a call is pending share its result
+advice_flights = SingleFlight()
+
+register_cache("advice", advice_cache.stats)
+register_gauges("single_flight", advice_flights.stats)
 
 # Pydantic models
 class AdviceIn(BaseModel):
@@ -78,12 +113,61 @@ def get_phase_info(phase: str) -> dict:
         "recommendations": "ориентируйтесь на самочувствие"
     })
 
-def generate_advice(task: str, phase: str, locale: str) -> dict:
+async def generate_advice(task: str, phase: str, locale: str) -> dict:
     """Generate AI advice for task based on cycle phase"""
+    cache_key = make_cache_key(task, phase, locale)
+    with stage("cache"):
+        cached = advice_cache.get(cache_key)
+    if cached is not None:
+        record_advice("cache")
+        return cached
+
+    return await advice_flights.do(cache_key, lambda: generate_advice_uncached(task, phase, locale, cache_key))
+
+async def generate_advice_uncached(task: str, phase: str, locale: str, cache_key: tuple) -> dict:
+    """Prompt building and generation behind the cache and single-flight layers"""
+    # Under load, concurrent requests of the same phase share one prompt
+    if advice_batcher is not None:
+        return await advice_batcher.submit((task, phase, locale))
+
+    with stage("prompt"):
+        prompt = build_advice_prompt(task, phase, locale)
+
+    try:
+        async with llm_semaphore:
+            with stage("llm"):
+                response = await model.generate_content_async(prompt)
+        
+        # Parse JSON (extracted from a markdown fence if the model added one)
+        try:
+            with stage("parse"):
+                result = json.loads(extract_json_text(response.text))
+            if not isinstance(result, dict):
+                # Valid JSON but not an advice object (e.g. an array)
+                raise json.JSONDecodeError("expected a JSON object", response.text, 0)
+            advice_data = {
+                "verdict": result.get("verdict", "ok"),
+                "reason": result.get("reason", ""),
+                "suggestion": result.get("suggestion", "")
+            }
+            advice_cache.set(cache_key, advice_data)
+            record_advice("llm")
+            return advice_data
+        except json.JSONDecodeError:
+            # Fallback if JSON parsing fails
+            record_parse_failure("single")
+            return get_fallback_advice(phase, locale)
+            
+    except Exception as e:
+        print(f"Error generating advice: {e}")
+        return get_fallback_advice(phase, locale)
+
+def build_advice_prompt(task: str, phase: str, locale: str) -> str:
+    """Build the single-task prompt"""
     phase_info = get_phase_info(phase)
     
     if locale == "ru":
-        prompt = f"""Ты - эксперт по женскому здоровью и менструальному циклу.
+        return f"""Ты - эксперт по женскому здоровью и менструальному циклу.
 
 Фаза цикла: {phase_info['description']}
 Характеристики фазы: {phase_info['characteristics']}
@@ -101,7 +185,7 @@ def generate_advice(task: str, phase: str, locale: str) -> dict:
 Пример ответа:
 {{"verdict": "good", "reason": "пик энергии", "suggestion": "отличное время для важных встреч"}}"""
     else:
-        prompt = f"""You are an expert in women's health and menstrual cycle.
+        return f"""You are an expert in women's health and menstrual cycle.
 
 Cycle phase: {phase_info['description']}
 Phase characteristics: {phase_info['characteristics']}
@@ -119,35 +203,94 @@ Respond in JSON format with fields:
 Example response:
 {{"verdict": "good", "reason": "peak energy", "suggestion": "great time for important meetings"}}"""
 
+def build_batch_prompt(phase: str, locale: str, tasks: List[str]) -> str:
+    """Build one prompt that asks for advice on several tasks of the same phase"""
+    phase_info = get_phase_info(phase)
+    
+    if locale == "ru":
+        tasks_block = "\n".join(f"Задача {i}: {task}" for i, task in enumerate(tasks, 1))
+        return f"""Ты - эксперт по женскому здоровью и менструальному циклу.
+
+Фаза цикла: {phase_info['description']}
+Характеристики фазы: {phase_info['characteristics']}
+Общие рекомендации: {phase_info['recommendations']}
+
+{tasks_block}
+
+Проанализируй каждую задачу с учетом фазы менструального цикла и дай персональный совет.
+
+Отвечай JSON-массивом, по одному объекту на каждую задачу, с полями:
+- id: номер задачи
+- verdict: "good" (отлично), "ok" (нормально), "avoid" (избегать)
+- reason: объяснение почему
+- suggestion: конкретный совет
+
+Пример ответа:
+[{{"id": 1, "verdict": "good", "reason": "пик энергии", "suggestion": "отличное время для важных встреч"}}]"""
+    else:
+        tasks_block = "\n".join(f"Task {i}: {task}" for i, task in enumerate(tasks, 1))
+        return f"""You are an expert in women's health and menstrual cycle.
+
+Cycle phase: {phase_info['description']}
+Phase characteristics: {phase_info['characteristics']}
+General recommendations: {phase_info['recommendations']}
+
+{tasks_block}
+
+Analyze every task considering the menstrual cycle phase and give personalized advice.
+
+Respond with a JSON array, one object per task, with fields:
+- id: task number
+- verdict: "good", "ok", "avoid"
+- reason: explanation why
+- suggestion: specific advice
+
+Example response:
+[{{"id": 1, "verdict": "good", "reason": "peak energy", "suggestion": "great time for important meetings"}}]"""
+
+async def generate_advice_chunk(phase: str, locale: str, tasks: List[str]) -> List[dict]:
+    """Generate advice for several tasks of one phase and locale with a single model call"""
+    answers = [None] * len(tasks)
     try:
-        response = model.generate_content(prompt)
-        # Try to parse JSON from response
-        text = response.text.strip()
-        
-        # Extract JSON from response if it's wrapped in markdown
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0].strip()
-        elif "```" in text:
-            text = text.split("```")[1].split("```")[0].strip()
-        
-        # Parse JSON
-        try:
-            result = json.loads(text)
-            return {
-                "verdict": result.get("verdict", "ok"),
-                "reason": result.get("reason", ""),
-                "suggestion": result.get("suggestion", "")
-            }
-        except json.JSONDecodeError:
-            # Fallback if JSON parsing fails
-            return get_fallback_advice(phase, locale)
-            
+        with stage("prompt"):
+            prompt = build_batch_prompt(phase, locale, tasks)
+        async with llm_semaphore:
+            with stage("llm"):
+                response = await model.generate_content_async(prompt, generation_config=BATCH_GENERATION_CONFIG)
+        with stage("parse"):
+            answers = parse_batch_answers(response.text, len(tasks))
+        record_parse_failure("batch", answers.count(None))
     except Exception as e:
-        print(f"Error generating advice: {e}")
-        return get_fallback_advice(phase, locale)
+        print(f"Error generating batch advice: {e}")
+
+    results = []
+    for task, answer in zip(tasks, answers):
+        if answer is None:
+            results.append(get_fallback_advice(phase, locale))
+            continue
+        advice_data = {
+            "verdict": answer["verdict"],
+            "reason": answer["reason"],
+            "suggestion": answer["suggestion"]
+        }
+        advice_cache.set(make_cache_key(task, phase, locale), advice_data)
+        record_advice("llm")
+        results.append(advice_data)
+    return results
+
+async def run_advice_micro_batch(items: List[tuple]) -> List[dict]:
+    """Micro-batch callback: all items share one phase and locale"""
+    _, phase, locale = items[0]
+    return await generate_advice_chunk(phase, locale, [task for task, _, _ in items])
+
+# Opt-in aggregation of concurrent /advice requests (ADVICE_MICRO_BATCH=1)
+advice_batcher = MicroBatcher(run_advice_micro_batch, group_key=lambda item: (item[1], item[2])) if MICRO_BATCH_ENABLED else None
+if advice_batcher is not None:
+    register_gauges("micro_batch", advice_batcher.stats)
 
 def get_fallback_advice(phase: str, locale: str) -> dict:
     """Fallback advice when AI is not available"""
+    record_advice("fallback")
     fallback = {
         "menstruation": {
             "ru": ("avoid", "низкая энергия", "перенеси или упрости задачу"),
@@ -178,10 +321,10 @@ def get_fallback_advice(phase: str, locale: str) -> dict:
 
 # API endpoints
 @app.post("/advice", response_model=AdviceOut)
-def advice(payload: AdviceIn):
+async def advice(payload: AdviceIn):
     try:
         # Generate AI advice
-        advice_data = generate_advice(payload.task, payload.phase, payload.locale)
+        advice_data = await generate_advice(payload.task, payload.phase, payload.locale)
         
         # Validate verdict
         if advice_data["verdict"] not in ("good", "ok", "avoid"):
@@ -199,6 +342,16 @@ def advice(payload: AdviceIn):
 def health():
     return {"status": "ok", "message": "Female Task Planner API is running"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Advice cache size, hit/miss counters and coalesced requests"""
+    return {**advice_cache.stats(), "single_flight": advice_flights.stats()}
+
+@app.get("/batching/stats")
+def batching_stats():
+    """Micro-batching counters"""
+    return advice_batcher.stats() if advice_batcher else {"enabled": False}
+
 @app.get("/")
 def root():
     return {"message": "Female Task Planner API", "version": "1.0.0"}
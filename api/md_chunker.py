@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Markdown-structure-aware chunker for the knowledge base.
+
+Documents are split on markdown headings, so a "### Luteal Phase" heading
+always stays with its content. Every chunk starts with its heading path
+and carries it as metadata, together with the cycle phase it is about
+("general" when it is not about a single phase). Short sibling sections
+of the same phase are merged and long sections are split on paragraph
+boundaries to stay within a token budget.
+"""
+
+import os
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "60"))
+
+GENERAL_PHASE = "general"
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Patterns (regex, matched from a word start) that mark a text as being about
+# one phase, English and Russian. The bare word "menstruation" names the topic
+# of the whole knowledge base, so that phase needs phase context.
+PHASE_KEYWORDS = {
+    "menstruation": (r"menstrual phase", r"menstruation phase", r"phase of menstruation",
+                     r"during (?:the |your |her |their )?(?:period|menstruation)\b",
+                     r"on (?:your |her |their )?period\b",
+                     r"менструальн\w* фаз", r"фаз\w* менструац", r"во время менструац", r"месячн"),
+    "follicular": ("follicular", "фолликул"),
+    "ovulation": ("ovulation", "ovulatory", "овуляц"),
+    "luteal": ("luteal", "pms", "premenstrual", "лютеал", "лютеинов", "пмс"),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: words and punctuation marks"""
+    return len(TOKEN_RE.findall(text))
+
+
+def phases_in(text: str) -> List[Tuple[int, str, int]]:
+    """(first position, phase, mentions) for every phase mentioned in the text"""
+    lower = text.lower()
+    found = []
+    for phase, keywords in PHASE_KEYWORDS.items():
+        matches = [m.start() for k in keywords for m in re.finditer(r"\b" + k, lower)]
+        if matches:
+            found.append((min(matches), phase, len(matches)))
+    return sorted(found)
+
+
+def detect_phase(heading_path: List[str], body: str) -> str:
+    """Phase named by the section heading, else the only phase the body
+    mentions, if it does so at least twice, else general.
+
+    A body comparing several phases stays general, so every phase filter
+    can retrieve it.
+    """
+    if heading_path:
+        in_heading = phases_in(heading_path[-1])
+        if in_heading:
+            return in_heading[0][1]
+    in_body = phases_in(body)
+    if len(in_body) == 1 and in_body[0][2] >= 2:
+        return in_body[0][1]
+    return GENERAL_PHASE
+
+
+def parse_sections(text: str) -> List[Tuple[List[str], str]]:
+    """Split markdown into (heading path, body) sections"""
+    sections = []
+    path: List[Tuple[int, str]] = []
+    body: List[str] = []
+
+    def flush():
+        content = "\n".join(body).strip()
+        if content:
+            sections.append(([title for _, title in path], content))
+        body.clear()
+
+    for line in text.splitlines():
+        match = HEADING_RE.match(line)
+        if match:
+            flush()
+            level = len(match.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, match.group(2)))
+        else:
+            body.append(line)
+    flush()
+    return sections
+
+
+def split_long(body: str, max_tokens: int) -> List[str]:
+    """Pack paragraphs (or sentences of an oversized paragraph) into pieces of max_tokens"""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", body):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) > max_tokens:
+            units.extend(s for s in SENTENCE_RE.split(paragraph) if s.strip())
+        else:
+            units.append(paragraph)
+
+    pieces, current, current_tokens = [], [], 0
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        pieces.append("\n\n".join(current))
+    return pieces
+
+
+def chunk_markdown(text: str, metadata: Optional[dict] = None, max_tokens: int = CHUNK_MAX_TOKENS,
+                   min_tokens: int = CHUNK_MIN_TOKENS) -> List[Document]:
+    """Chunk one markdown text into Documents with heading_path and phase metadata"""
+    metadata = metadata or {}
+
+    # Step 1: sections with their phase
+    sections = []
+    for heading_path, body in parse_sections(text):
+        sections.append({
+            "path": heading_path,
+            "phase": detect_phase(heading_path, body),
+            "body": body,
+            "tokens": estimate_tokens(body),
+        })
+
+    # Step 2: merge short sections into the previous sibling of the same phase
+    merged = []
+    for section in sections:
+        previous = merged[-1] if merged else None
+        if (previous is not None
+                and previous["phase"] == section["phase"]
+                and previous["path"][:-1] == section["path"][:-1]
+                and min(previous["tokens"], section["tokens"]) < min_tokens
+                and previous["tokens"] + section["tokens"] <= max_tokens):
+            title = section["path"][-1] if section["path"] else ""
+            previous["body"] += f"\n\n{title}\n{section['body']}" if title else f"\n\n{section['body']}"
+            previous["tokens"] += section["tokens"]
+            continue
+        merged.append(dict(section))
+
+    # Step 3: split oversized sections and prefix every chunk with its heading path
+    chunks = []
+    for section in merged:
+        heading = " > ".join(section["path"])
+        for piece in split_long(section["body"], max_tokens):
+            content = f"{heading}\n\n{piece}" if heading else piece
+            chunks.append(Document(
+                page_content=content,
+                metadata={
+                    **metadata,
+                    "heading_path": heading,
+                    "phase": section["phase"],
+                    "tokens": estimate_tokens(content),
+                }
+            ))
+    return chunks
+
+
+def split_markdown_documents(documents: List[Document], max_tokens: int = CHUNK_MAX_TOKENS,
+                             min_tokens: int = CHUNK_MIN_TOKENS) -> List[Document]:
+    """Drop-in for text_splitter.split_documents() on markdown documents"""
+    chunks = []
+    for document in documents:
+        chunks.extend(chunk_markdown(document.page_content, document.metadata, max_tokens, min_tokens))
+    return chunks
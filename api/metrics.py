@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Minimal Prometheus metrics for the API servers, without extra dependencies.
+
+Counters, gauges and histograms keep their values in plain dicts guarded by
+a lock, so recording costs a dict lookup and an addition. The text
+exposition format is only rendered when /metrics is scraped; values that
+already live elsewhere (cache stats, circuit breaker state) are read at
+scrape time through collectors instead of being mirrored on every request.
+
+    from metrics import install_metrics, stage, record_advice
+    install_metrics(app)                    # /metrics + HTTP metrics
+    with stage("llm"):                      # latency histogram per stage
+        response = await model.generate_content_async(prompt)
+    record_advice("llm")                    # llm / fallback / cache counters
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers cache hits (~µs) up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named metric family with fixed label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in items
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in items
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        lines = self.header()
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Metric families plus scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """collector() returns exposition lines; it is called on every scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f"# collector error: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Advice pipeline
+STAGE_SECONDS = Histogram(
+    "advice_stage_seconds", "Time spent in each advice pipeline stage", ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "advice_stage_errors_total", "Exceptions raised inside a pipeline stage", ["stage"]
+)
+ADVICE_RESPONSES = Counter(
+    "advice_responses_total", "Advice answers by where they came from (llm, fallback, cache)", ["source"]
+)
+JSON_PARSE_FAILURES = Counter(
+    "advice_json_parse_failures_total", "Model answers that were not valid advice JSON", ["kind"]
+)
+
+# HTTP
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+HTTP_REQUESTS = Counter("http_requests_total", "Handled requests", ["method", "route", "status"])
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "Request latency", ["method", "route"])
+
+
+@contextmanager
+def stage(name: str):
+    """Record the duration of a pipeline stage (and an error if it raises)"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, name)
+
+
+def record_advice(source: str):
+    """Count one advice answer by source: "llm", "fallback" or "cache" """
+    ADVICE_RESPONSES.inc(source)
+
+
+def record_parse_failure(kind: str = "single", count: int = 1):
+    if count:
+        JSON_PARSE_FAILURES.inc(kind, amount=count)
+
+
+def register_cache(name: str, stats: Callable[[], dict], registry: Registry = None):
+    """Export hits, misses, size and hit ratio of a cache with a stats() dict"""
+
+    def collect() -> List[str]:
+        data = stats()
+        lines = []
+        for key, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                          ("invalidations", "counter"), ("size", "gauge"), ("hit_ratio", "gauge")):
+            if key in data:
+                metric = f"{name}_cache_{key}" + ("_total" if kind == "counter" else "")
+                lines += [f"# TYPE {metric} {kind}", f"{metric} {_number(data[key])}"]
+        return lines
+
+    (registry or REGISTRY).add_collector(collect)
+
+
+def register_gauges(prefix: str, values: Callable[[], Dict[str, float]], registry: Registry = None):
+    """Export numeric values of a stats() dict as gauges named prefix_key"""
+
+    def collect() -> List[str]:
+        lines = []
+        for key, value in values().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f"{prefix}_{key}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {_number(value)}"]
+        return lines
+
+    (registry or REGISTRY).add_collector(collect)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: in-flight gauge, request counter and latency per route template"""
+
+    def __init__(self, app, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Route templates ("/phases/{phase}") keep the label set small
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_SECONDS.observe(time.perf_counter() - started, method, path)
+            HTTP_REQUESTS.inc(method, path, str(status["code"]))
+
+
+def install_metrics(app, registry: Registry = None):
+    """Add the middleware and a GET /metrics endpoint to a FastAPI app"""
+    from fastapi.responses import PlainTextResponse
+
+    registry = registry or REGISTRY
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
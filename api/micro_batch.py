@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Server-side micro-batching of concurrent advice requests.
+
+Requests that share a group key (e.g. the cycle phase) and arrive within
+``max_wait_ms`` of each other are collected into one batch, handed to a
+single batch function call (one combined Gemini prompt) and the results
+are fanned back out to the waiting callers.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+MICRO_BATCH_ENABLED = os.getenv("ADVICE_MICRO_BATCH", "0").lower() in ("1", "true", "yes")
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("ADVICE_MICRO_BATCH_WAIT_MS", "10"))
+MICRO_BATCH_MAX_SIZE = int(os.getenv("ADVICE_MICRO_BATCH_SIZE", "8"))
+
+
+class MicroBatcher:
+    """Collect requests per group for a few milliseconds, then run them as one batch"""
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+                 group_key: Callable[[Any], Hashable],
+                 max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS,
+                 max_batch_size: int = MICRO_BATCH_MAX_SIZE):
+        self.batch_fn = batch_fn
+        self.group_key = group_key
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._running = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result from the batch"""
+        loop = asyncio.get_running_loop()
+        key = self.group_key(item)
+        future = loop.create_future()
+
+        bucket = self._pending.setdefault(key, [])
+        bucket.append((item, future))
+        if len(bucket) >= self.max_batch_size:
+            self._flush(key)
+        elif len(bucket) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        bucket = self._pending.pop(key, None)
+        if not bucket:
+            return
+        task = asyncio.ensure_future(self._run(bucket))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, bucket: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(bucket)
+        try:
+            results = await self.batch_fn([item for item, _ in bucket])
+        except Exception as e:
+            for _, future in bucket:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(bucket, results):
+            if not future.done():
+                future.set_result(result)
+        for _, future in bucket[len(results):]:
+            if not future.done():
+                future.set_exception(RuntimeError("batch returned fewer results than items"))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "pending": sum(len(bucket) for bucket in self._pending.values()),
+        }
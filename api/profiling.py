@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+On-demand profiling of live requests.
+
+Installed with one line per app, no changes in the handlers:
+
+    install_profiling(app)
+
+Single request: send ``X-Profile: sample`` (or ``cprofile``) together with
+``X-Profile-Token`` equal to PROFILE_TOKEN (ADMIN_TOKEN when unset). The
+response carries ``X-Profile-File`` naming the stored profile, which can
+be fetched from GET /admin/profiles/{name}.
+
+- sample: a background thread snapshots the Python stacks of all busy
+  threads every PROFILE_INTERVAL_MS and stores them in collapsed-stack
+  format (.folded), ready for flamegraph.pl or speedscope.
+- cprofile: deterministic cProfile of the event-loop thread (.prof for
+  pstats/snakeviz). Handlers declared with ``def`` run in the threadpool
+  and only show up in "sample" mode.
+
+Aggregate mode: POST /admin/profiling {"every": N, "seconds": T} samples
+one in N requests to PROFILE_PATHS for T seconds into a single collapsed
+profile; GET /admin/profiling shows its hottest stacks.
+
+Both modes see the whole process, so concurrent requests handled during a
+profiled one appear in its profile too.
+"""
+
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+from admin import ADMIN_TOKEN, check_admin_token, require_admin
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or ADMIN_TOKEN
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_PATHS = tuple(p for p in os.getenv("PROFILE_PATHS", "/advice,/search").split(",") if p)
+
+# Leaf frames of threads that are parked rather than working
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker"),
+}
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    """Collapsed-stack line (root first, ';'-separated) for a frame"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def render_folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class StackSampler:
+    """Samples the stacks of all busy threads into the attached counters"""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self._sessions: Dict[int, list] = {}  # id(counter) -> [counter, attached requests]
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, stacks: Counter):
+        with self._lock:
+            session = self._sessions.setdefault(id(stacks), [stacks, 0])
+            session[1] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def detach(self, stacks: Counter):
+        with self._lock:
+            session = self._sessions.get(id(stacks))
+            if session is not None:
+                session[1] -= 1
+                if session[1] <= 0:
+                    del self._sessions[id(stacks)]
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                targets = [session[0] for session in self._sessions.values()]
+                if not targets:
+                    self._thread = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or is_idle(frame):
+                    continue
+                stack = collapse_stack(frame, names.get(ident, str(ident)))
+                for stacks in targets:
+                    stacks[stack] += 1
+            time.sleep(self.interval)
+
+
+class AggregateProfile:
+    """1-in-N sampled requests over a time window, collected into one profile"""
+
+    def __init__(self, every: int, seconds: float):
+        self.every = max(1, every)
+        self.started = time.time()
+        self.until = time.monotonic() + seconds
+        self.seconds = seconds
+        self.seen = 0
+        self.profiled = 0
+        self.stacks = Counter()
+        self.saved_as = None
+
+    @property
+    def active(self) -> bool:
+        return self.saved_as is None and time.monotonic() < self.until
+
+    def select(self) -> bool:
+        """Count a request and decide whether it is one of the sampled ones"""
+        self.seen += 1
+        if (self.seen - 1) % self.every:
+            return False
+        self.profiled += 1
+        return True
+
+    def status(self, top: int = 20) -> dict:
+        return {
+            "active": self.active,
+            "every": self.every,
+            "seconds": self.seconds,
+            "remaining_seconds": max(0.0, round(self.until - time.monotonic(), 1)),
+            "requests_seen": self.seen,
+            "requests_profiled": self.profiled,
+            "samples": sum(self.stacks.values()),
+            "saved_as": self.saved_as,
+            "top_stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(top)],
+        }
+
+
+class Profiler:
+    """Per-process profiling state shared by the middleware and the admin endpoints"""
+
+    def __init__(self, directory: str = PROFILE_DIR, paths=PROFILE_PATHS):
+        self.directory = directory
+        self.paths = paths
+        self.sampler = StackSampler()
+        self.aggregate: Optional[AggregateProfile] = None
+        self._cprofile_lock = threading.Lock()
+
+    def profile_name(self, path: str, extension: str) -> str:
+        slug = re.sub(r"[^a-zA-Z0-9]+", "-", path).strip("-") or "root"
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:6]}.{extension}"
+
+    def save_text(self, name: str, text: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+            f.write(text)
+        return name
+
+    def matches(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.paths)
+
+    def finish_aggregate(self):
+        aggregate = self.aggregate
+        if aggregate is not None and aggregate.saved_as is None and aggregate.stacks:
+            aggregate.saved_as = self.save_text(self.profile_name("aggregate", "folded"),
+                                                render_folded(aggregate.stacks))
+
+    def list_profiles(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.listdir(self.directory), reverse=True)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests asked for by header or picked by the aggregate"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiler = self.profiler
+        headers = dict(scope.get("headers") or [])
+        mode = headers.get(b"x-profile", b"").decode("latin-1").lower()
+        if mode and not check_admin_token(headers.get(b"x-profile-token", b"").decode("latin-1"), PROFILE_TOKEN):
+            mode = ""
+
+        if mode in ("sample", "cprofile"):
+            await self._profile_request(mode, scope, receive, send)
+            return
+
+        aggregate = profiler.aggregate
+        if aggregate is not None and aggregate.active and profiler.matches(scope["path"]) and aggregate.select():
+            profiler.sampler.attach(aggregate.stacks)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                profiler.sampler.detach(aggregate.stacks)
+            return
+        if aggregate is not None and not aggregate.active:
+            profiler.finish_aggregate()
+
+        await self.app(scope, receive, send)
+
+    async def _profile_request(self, mode: str, scope, receive, send):
+        profiler = self.profiler
+        # cProfile hooks are per thread and cannot nest: concurrent ones fall back to sampling
+        if mode == "cprofile" and not profiler._cprofile_lock.acquire(blocking=False):
+            mode = "sample"
+        name = profiler.profile_name(scope["path"], "prof" if mode == "cprofile" else "folded")
+
+        async def send_with_name(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", name.encode())]
+            await send(message)
+
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                try:
+                    await self.app(scope, receive, send_with_name)
+                finally:
+                    profile.disable()
+                os.makedirs(profiler.directory, exist_ok=True)
+                profile.dump_stats(os.path.join(profiler.directory, name))
+            finally:
+                profiler._cprofile_lock.release()
+            return
+
+        stacks = Counter()
+        profiler.sampler.attach(stacks)
+        try:
+            await self.app(scope, receive, send_with_name)
+        finally:
+            profiler.sampler.detach(stacks)
+            profiler.save_text(name, render_folded(stacks))
+
+
+def install_profiling(app, profiler: Profiler = None) -> Profiler:
+    """Add the profiling middleware and its admin endpoints to a FastAPI app"""
+    from fastapi import Body, Depends, HTTPException
+    from fastapi.responses import FileResponse
+
+    profiler = profiler or Profiler()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    admin = [Depends(require_admin)]
+
+    @app.post("/admin/profiling", dependencies=admin, include_in_schema=False)
+    def start_aggregate_profile(every: int = Body(10, embed=True), seconds: float = Body(60, embed=True)):
+        """Sample 1 in `every` profiled-path requests for `seconds` into one profile"""
+        profiler.finish_aggregate()
+        profiler.aggregate = AggregateProfile(every, seconds)
+        return profiler.aggregate.status()
+
+    @app.get("/admin/profiling", dependencies=admin, include_in_schema=False)
+    def aggregate_profile_status():
+        if profiler.aggregate is None:
+            return {"active": False, "profiles": profiler.list_profiles()}
+        if not profiler.aggregate.active:
+            profiler.finish_aggregate()
+        return {**profiler.aggregate.status(), "profiles": profiler.list_profiles()}
+
+    @app.delete("/admin/profiling", dependencies=admin, include_in_schema=False)
+    def stop_aggregate_profile():
+        if profiler.aggregate is None:
+            return {"active": False}
+        profiler.aggregate.until = time.monotonic()
+        profiler.finish_aggregate()
+        return profiler.aggregate.status()
+
+    @app.get("/admin/profiles/{name}", dependencies=admin, include_in_schema=False)
+    def download_profile(name: str):
+        path = os.path.join(profiler.directory, os.path.basename(name))
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(path, media_type="application/octet-stream" if name.endswith(".prof") else "text/plain")
+
+    return profiler
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Inverted index with BM25 ranking for the structured RAG knowledge base.
+
+Every leaf string of the knowledge base (phase_info values, list items,
+task recommendations) becomes one small document. The index is built once
+and keeps, for every token, the postings of each phase separately, so a
+phase-scoped query only touches the postings of that phase.
+
+The same index can be built from any (phase, section, key, text) entries
+with ``KnowledgeIndex.from_entries``, e.g. over vector store chunks for the
+lexical prefilter of the hybrid retriever.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Russian words change their endings a lot ("презентацию" / "презентации"),
+# so tokens are cut to a fixed-length prefix that acts as a crude stem.
+STEM_LENGTH = 6
+MIN_TOKEN_LENGTH = 3
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase stemmed tokens"""
+    return [
+        word[:STEM_LENGTH]
+        for word in TOKEN_RE.findall(text.lower())
+        if len(word) >= MIN_TOKEN_LENGTH
+    ]
+
+
+def iter_knowledge_entries(knowledge_base: dict) -> Iterator[Tuple[str, str, str, str]]:
+    """Yield (phase, section, key, text) for every leaf of the knowledge base"""
+    for phase, phase_data in knowledge_base.items():
+        for section, content in phase_data.items():
+            if isinstance(content, dict):
+                for key, value in content.items():
+                    if isinstance(value, list):
+                        for item in value:
+                            yield phase, section, key, item
+                    elif isinstance(value, str):
+                        yield phase, section, key, value
+            elif isinstance(content, list):
+                for item in content:
+                    yield phase, section, section, item
+            elif isinstance(content, str):
+                yield phase, section, section, content
+
+
+class KnowledgeIndex:
+    """Precomputed inverted index: token -> phase -> [(doc_id, bm25 weight)]"""
+
+    def __init__(self, knowledge_base: dict, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[dict] = []
+        self.postings: Dict[str, Dict[str, List[Tuple[int, float]]]] = {}
+        self._build(iter_knowledge_entries(knowledge_base))
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Tuple[str, str, str, str]],
+                     k1: float = BM25_K1, b: float = BM25_B) -> "KnowledgeIndex":
+        """Index arbitrary (phase, section, key, text) entries"""
+        index = cls({}, k1=k1, b=b)
+        index._build(entries)
+        return index
+
+    def _build(self, entries: Iterable[Tuple[str, str, str, str]]):
+        self.documents = []
+        term_counts = []
+        document_frequency = defaultdict(int)
+
+        for phase, section, key, text in entries:
+            tokens = tokenize(text)
+            counts = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token in counts:
+                document_frequency[token] += 1
+            self.documents.append({
+                "content": text,
+                "phase": phase,
+                "section": section,
+                "key": key,
+                "length": len(tokens),
+            })
+            term_counts.append(counts)
+
+        total_docs = len(self.documents)
+        avg_length = sum(doc["length"] for doc in self.documents) / total_docs if total_docs else 0.0
+
+        # BM25 weights do not depend on the query, so they are stored
+        # directly in the postings and a search is just a sum of weights.
+        postings = defaultdict(lambda: defaultdict(list))
+        for doc_id, counts in enumerate(term_counts):
+            doc = self.documents[doc_id]
+            norm = 1 - self.b + self.b * (doc["length"] / avg_length if avg_length else 0.0)
+            for token, tf in counts.items():
+                df = document_frequency[token]
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                weight = idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                postings[token][doc["phase"]].append((doc_id, weight))
+
+        self.postings = {token: dict(by_phase) for token, by_phase in postings.items()}
+
+    def search(self, query: str, phases: Optional[Iterable[str]] = None,
+               limit: int = 3, offset: int = 0) -> List[dict]:
+        """Rank documents against the query, optionally restricted to some phases.
+
+        ``phases`` may be a single phase name, a list of names or None for a
+        global search over every phase. Only the best ``offset + limit``
+        documents are selected (with a heap), then the requested page is cut.
+        """
+        if limit <= 0 or offset < 0:
+            return []
+        ranked = self.top(query, phases, offset + limit)
+        return [self._result(doc_id, score) for doc_id, score in ranked[offset:]]
+
+    def top(self, query: str, phases: Optional[Iterable[str]] = None, n: int = 3) -> List[Tuple[int, float]]:
+        """Best n (doc_id, score) pairs, best first"""
+        if isinstance(phases, str):
+            phases = [phases]
+        elif phases is not None:
+            phases = list(phases)
+
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            by_phase = self.postings.get(token)
+            if not by_phase:
+                continue
+            if phases is None:
+                phase_postings = by_phase.values()
+            else:
+                phase_postings = [by_phase.get(phase, ()) for phase in phases]
+            for postings in phase_postings:
+                for doc_id, weight in postings:
+                    scores[doc_id] += weight
+
+        return heapq.nlargest(n, scores.items(), key=lambda item: item[1])
+
+    def _result(self, doc_id: int, score: float) -> dict:
+        doc = self.documents[doc_id]
+        return {
+            "content": doc["content"],
+            "phase": doc["phase"],
+            "section": doc["section"],
+            "key": doc["key"],
+            "relevance_score": round(score, 4),
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+
+def content_version(data) -> str:
+    """Short hash of JSON-serializable data"""
+    encoded = json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+class KnowledgeSnapshot:
+    """A knowledge base together with its index and per-phase content versions.
+
+    Snapshots are immutable once built; a reload builds a new one and swaps
+    the module-level reference, so a request keeps using one snapshot.
+    """
+
+    def __init__(self, knowledge_base: dict, version: int = 0):
+        self.knowledge_base = knowledge_base
+        self.index = KnowledgeIndex(knowledge_base)
+        self.version = version
+        self.phase_versions = {phase: content_version(data) for phase, data in knowledge_base.items()}
+
+    def tag(self, phase: str) -> Tuple[str, Optional[str]]:
+        """Cache tag of everything derived from one phase of this snapshot"""
+        return phase, self.phase_versions.get(phase)
+
+    def changed_tags(self, newer: "KnowledgeSnapshot") -> List[Tuple[str, Optional[str]]]:
+        """Tags of this snapshot whose phase content differs in the newer one"""
+        return [
+            self.tag(phase) for phase, version in self.phase_versions.items()
+            if newer.phase_versions.get(phase) != version
+        ]
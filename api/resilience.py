@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Latency budget and circuit breaker for LLM calls.
+
+call_with_deadline() waits for an LLM call at most ``timeout`` seconds and
+then answers with a fallback while the call keeps running in the
+background (so its result can still fill the advice cache). The circuit
+breaker stops sending requests to the LLM after repeated timeouts or
+errors and lets a single probe through once the reset timeout has passed.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+ADVICE_DEADLINE_SECONDS = float(os.getenv("ADVICE_DEADLINE_SECONDS", "4"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open probe -> closed"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.timeouts = 0
+
+    def allow_request(self) -> bool:
+        """Whether the next call may go to the LLM"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, timeout: bool = False):
+        with self._lock:
+            self.consecutive_failures += 1
+            if timeout:
+                self.timeouts += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """The call was abandoned without an outcome (e.g. the client went away)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+
+def _consume_exception(task: asyncio.Future):
+    # A call that finishes after the deadline has no awaiting caller left
+    if not task.cancelled():
+        exc = task.exception()
+        if exc is not None:
+            print(f"Late LLM call failed: {exc}")
+
+
+async def call_with_deadline(call: Awaitable[Any], timeout: float, breaker: CircuitBreaker,
+                             on_timeout: Callable[[], Any]) -> Any:
+    """Await an LLM call within a latency budget, recording the outcome in the breaker.
+
+    On timeout the fallback from on_timeout() is returned immediately and the
+    call is left running. Exceptions from the call are re-raised.
+    """
+    task = asyncio.ensure_future(call)
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        task.add_done_callback(_consume_exception)
+        breaker.record_failure(timeout=True)
+        return on_timeout()
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
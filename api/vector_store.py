@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight vector store for small knowledge bases.
+
+Vectors live in one contiguous float32 matrix saved as an .npy file and
+opened with mmap, so several uvicorn workers share the same physical
+pages. Texts, ids and metadata are kept in a JSON sidecar. Search is exact:
+one matrix-vector product over the normalized rows and argpartition for
+the top-k.
+
+With quantization="int8" a second matrix of int8 codes (per-dimension
+scales) is kept next to the float vectors. The first pass scans only the
+int8 codes, then the top candidates are re-scored exactly against the
+float rows, so resident memory is dominated by the 4x smaller codes.
+
+Writes never modify files in place: a new vectors-<generation>.npy is
+written first, then metadata.json (which names the vectors file) is
+atomically replaced. Readers therefore always see a matching pair.
+Writers in different processes (uvicorn --workers N) sharing a directory
+serialize on an flock'ed lock file and start from the latest published
+generation; files are only removed once they are two generations old.
+Readers reload whenever metadata.json is replaced by another process.
+
+Rows are stored grouped by the partition key (the chunk "phase" by
+default). A filter on that key only scans the matching row ranges, which
+are slices of the mapped matrix, so a phase query touches a fraction of
+the vectors without copying them.
+"""
+
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+METADATA_FILE = "metadata.json"
+LOCK_FILE = ".write.lock"
+
+# Attempts to open a published generation whose files a newer write just removed
+LOAD_ATTEMPTS = 3
+
+# "int8" - quantized first pass with exact rerank, anything else - exact scan
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "").lower() or None
+RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+
+# Metadata key rows are grouped by; empty - no partitioning
+PARTITION_KEY = os.getenv("VECTOR_PARTITION_KEY", "phase") or None
+
+# Rows converted to float32 at a time during the quantized scan
+QUANTIZED_SCAN_BLOCK = 512
+
+
+class IndexState(NamedTuple):
+    """Everything a search reads, published with a single attribute assignment"""
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[dict]
+    vectors: np.ndarray
+    codes: Optional[np.ndarray]
+    scale: Optional[np.ndarray]
+    partitions: List[Tuple[Any, int, int]]
+    generation: int
+
+
+EMPTY_STATE = IndexState([], [], [], np.zeros((0, 0), dtype=np.float32), None, None, [], 0)
+
+
+def file_generation(name: str) -> int:
+    """Generation of a vectors-<generation>-<token>.npy / codes-... file name"""
+    try:
+        return int(name.split("-")[1])
+    except (IndexError, ValueError):
+        return -1
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a matrix (zero rows stay zero)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def matches_filter(metadata: dict, where: dict) -> bool:
+    """Chroma-style metadata filter: {"key": value} or {"key": {"$in": [...]}}"""
+    for key, expected in where.items():
+        value = metadata.get(key)
+        if isinstance(expected, dict):
+            if "$in" in expected and value not in expected["$in"]:
+                return False
+            if "$eq" in expected and value != expected["$eq"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def partition_runs(metadatas: List[dict], key: Optional[str]) -> List[Tuple[Any, int, int]]:
+    """(value, start, stop) for every run of consecutive rows sharing the key's value"""
+    runs = []
+    if not key:
+        return runs
+    for row, metadata in enumerate(metadatas):
+        value = metadata.get(key)
+        if runs and runs[-1][0] == value:
+            runs[-1][2] = row + 1
+        else:
+            runs.append([value, row, row + 1])
+    return [tuple(run) for run in runs]
+
+
+def partition_slices(runs: List[Tuple[Any, int, int]], key: Optional[str],
+                     where: Optional[dict]) -> Tuple[Optional[List[Tuple[int, int]]], Optional[dict]]:
+    """Row ranges a filter can match and the rest of the filter, or (None, where) for a full scan"""
+    if not key or not where or key not in where:
+        return None, where
+    expected = where[key]
+    if isinstance(expected, dict):
+        if set(expected) == {"$in"}:
+            values = list(expected["$in"])
+        elif set(expected) == {"$eq"}:
+            values = [expected["$eq"]]
+        else:
+            return None, where
+    else:
+        values = [expected]
+    rest = {k: v for k, v in where.items() if k != key}
+    return [(start, stop) for value, start, stop in runs if value in values], rest or None
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-dimension symmetric int8 quantization: matrix ~= codes * scale"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.size == 0:
+        return np.zeros(matrix.shape, dtype=np.int8), np.ones(matrix.shape[1], dtype=np.float32)
+    scale = np.abs(matrix).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+def quantized_scores(codes: np.ndarray, scale: np.ndarray, query: np.ndarray,
+                     block: int = QUANTIZED_SCAN_BLOCK) -> np.ndarray:
+    """Approximate dot products of all rows with the query, scanned in blocks"""
+    scaled_query = (query * scale).astype(np.float32)
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], block):
+        scores[start:start + block] = codes[start:start + block].astype(np.float32) @ scaled_query
+    return scores
+
+
+def search_quantized(vectors: np.ndarray, codes: np.ndarray, scale: np.ndarray, query: np.ndarray,
+                     k: int, rerank_factor: int = RERANK_FACTOR,
+                     allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """int8 first pass, exact float rerank of the best k * rerank_factor rows"""
+    approx = quantized_scores(codes, scale, query)
+    if allowed is not None:
+        approx = np.where(allowed, approx, -np.inf)
+        k = min(k, int(allowed.sum()))
+    candidates = top_k_indices(approx, max(k, k * rerank_factor))
+    candidates = np.sort(candidates[np.isfinite(approx[candidates])])
+    exact = np.asarray(vectors[candidates], dtype=np.float32) @ query
+    order = top_k_indices(exact, k)
+    return candidates[order], exact[order]
+
+
+class NumpyVectorStore(VectorStore):
+    """Cosine-similarity vector store backed by a memory-mapped .npy file"""
+
+    def __init__(self, embedding: Embeddings, persist_directory: Optional[str] = None,
+                 quantization: Optional[str] = VECTOR_QUANTIZATION, rerank_factor: int = RERANK_FACTOR,
+                 partition_key: Optional[str] = PARTITION_KEY):
+        self._embedding = embedding
+        self.persist_directory = persist_directory
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.partition_key = partition_key
+        self._row_of = None
+        # Writers serialize on the lock; readers take one reference to the state
+        self._lock = threading.Lock()
+        self._state = EMPTY_STATE
+        # Identity of the metadata.json the state was loaded from
+        self._signature = None
+        self._dir_lock = threading.Lock()
+        self._dir_lock_depth = 0
+        self._dir_lock_file = None
+        if persist_directory and os.path.isfile(os.path.join(persist_directory, METADATA_FILE)):
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def generation(self) -> int:
+        return self._state.generation
+
+    def __len__(self) -> int:
+        return len(self._state.ids)
+
+    def partition_sizes(self) -> dict:
+        """Rows per partition value"""
+        sizes = {}
+        for value, start, stop in self._state.partitions:
+            sizes[value] = sizes.get(value, 0) + stop - start
+        return sizes
+
+    # Persistence
+
+    def _metadata_signature(self):
+        try:
+            stat = os.stat(os.path.join(self.persist_directory, METADATA_FILE))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def refresh(self) -> bool:
+        """Reload if another process published a new generation; True if it did"""
+        if not self.persist_directory:
+            return False
+        signature = self._metadata_signature()
+        if signature is None or signature == self._signature:
+            return False
+        with self._lock:
+            if self._metadata_signature() == self._signature:
+                return False
+            self._load()
+        return True
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the directory's write lock, across processes, on top of the latest generation.
+
+        Nested and concurrent use within one process shares the same lock.
+        """
+        with self._dir_lock:
+            if self._dir_lock_depth == 0 and self.persist_directory:
+                os.makedirs(self.persist_directory, exist_ok=True)
+                lock_file = open(os.path.join(self.persist_directory, LOCK_FILE), "a")
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._dir_lock_file = lock_file
+                self.refresh()
+            self._dir_lock_depth += 1
+        try:
+            yield self
+        finally:
+            with self._dir_lock:
+                self._dir_lock_depth -= 1
+                if self._dir_lock_depth == 0 and self._dir_lock_file is not None:
+                    # Closing the descriptor releases the flock
+                    self._dir_lock_file.close()
+                    self._dir_lock_file = None
+
+    def _load(self):
+        for attempt in range(LOAD_ATTEMPTS):
+            with open(os.path.join(self.persist_directory, METADATA_FILE), encoding="utf-8") as f:
+                stat = os.fstat(f.fileno())
+                meta = json.load(f)
+            try:
+                self._load_generation(meta)
+            except FileNotFoundError:
+                # Two newer writes landed meanwhile; read the current metadata again
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+                continue
+            self._signature = stat.st_ino, stat.st_mtime_ns, stat.st_size
+            return
+
+    def _load_generation(self, meta: dict):
+        vectors = np.load(os.path.join(self.persist_directory, meta["vectors_file"]), mmap_mode="r")
+        codes, scale = None, None
+        if self.quantization == "int8":
+            if meta.get("codes_file"):
+                codes = np.load(os.path.join(self.persist_directory, meta["codes_file"]), mmap_mode="r")
+                scale = np.array(meta["scale"], dtype=np.float32)
+            else:
+                codes, scale = quantize_int8(vectors)
+        self._state = IndexState(
+            meta["ids"], meta["texts"], meta["metadatas"], vectors, codes, scale,
+            partition_runs(meta["metadatas"], self.partition_key), meta.get("generation", 0)
+        )
+
+    def _save(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: np.ndarray):
+        """Publish a new generation; persisted stores must be inside exclusive()"""
+        previous = self._state.generation
+        generation = previous + 1
+        if self.partition_key:
+            # Group rows by partition so each one is a single contiguous slice
+            key = self.partition_key
+            order = sorted(range(len(ids)), key=lambda i: str(metadatas[i].get(key, "")))
+            if order != list(range(len(ids))):
+                ids = [ids[i] for i in order]
+                texts = [texts[i] for i in order]
+                metadatas = [metadatas[i] for i in order]
+                vectors = np.ascontiguousarray(vectors[order])
+        codes, scale = quantize_int8(vectors) if self.quantization == "int8" else (None, None)
+        if not self.persist_directory:
+            self._state = IndexState(ids, texts, metadatas, vectors, codes, scale,
+                                     partition_runs(metadatas, self.partition_key), generation)
+            return
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        suffix = f"{generation}-{uuid.uuid4().hex[:8]}.npy"
+        vectors_file = f"vectors-{suffix}"
+        np.save(os.path.join(self.persist_directory, vectors_file), vectors)
+
+        meta = {
+            "generation": generation,
+            "vectors_file": vectors_file,
+            "ids": ids,
+            "texts": texts,
+            "metadatas": metadatas,
+        }
+        if codes is not None:
+            meta["codes_file"] = f"codes-{suffix}"
+            meta["scale"] = scale.tolist()
+            np.save(os.path.join(self.persist_directory, meta["codes_file"]), codes)
+        tmp_path = os.path.join(self.persist_directory, f".{METADATA_FILE}.{uuid.uuid4().hex[:8]}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.persist_directory, METADATA_FILE))
+
+        # Mapped pages of removed files stay valid for readers that still hold them.
+        # The previous generation is kept for readers that just read its metadata.
+        for name in os.listdir(self.persist_directory):
+            if name.startswith(("vectors-", "codes-")) and name.endswith(".npy") \
+                    and file_generation(name) < previous:
+                try:
+                    os.remove(os.path.join(self.persist_directory, name))
+                except OSError:
+                    pass
+        self._load()
+
+    # Writes
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        if hasattr(self._embedding, "embed_matrix"):
+            return self._embedding.embed_matrix(texts)
+        return np.array(self._embedding.embed_documents(texts), dtype=np.float32)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self._embed_texts(texts), metadatas=metadatas, ids=ids)
+
+    def add_embeddings(self, texts: List[str], embeddings, metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """Add texts whose vectors were computed elsewhere (e.g. by batched ingestion)"""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = [dict(m) for m in metadatas] if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        new_vectors = normalize_rows(embeddings)
+
+        with self.exclusive(), self._lock:
+            state = self._state
+            replaced = set(ids)
+            keep = [i for i, doc_id in enumerate(state.ids) if doc_id not in replaced]
+            old_vectors = np.asarray(state.vectors[keep], dtype=np.float32) if keep else None
+            vectors = new_vectors if old_vectors is None else np.vstack([old_vectors, new_vectors])
+            self._save(
+                [state.ids[i] for i in keep] + ids,
+                [state.texts[i] for i in keep] + texts,
+                [state.metadatas[i] for i in keep] + metadatas,
+                np.ascontiguousarray(vectors, dtype=np.float32)
+            )
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self.exclusive(), self._lock:
+            state = self._state
+            removed = set(ids)
+            keep = [i for i, doc_id in enumerate(state.ids) if doc_id not in removed]
+            if len(keep) == len(state.ids):
+                return False
+            vectors = np.asarray(state.vectors[keep], dtype=np.float32) if keep else np.zeros((0, state.vectors.shape[1]), dtype=np.float32)
+            self._save(
+                [state.ids[i] for i in keep],
+                [state.texts[i] for i in keep],
+                [state.metadatas[i] for i in keep],
+                np.ascontiguousarray(vectors)
+            )
+        return True
+
+    # Reads
+
+    def _row_index(self, ids: List[str]) -> dict:
+        """id -> row for the given ids list, built once per generation"""
+        cached = self._row_of
+        if cached is None or cached[0] is not ids:
+            cached = (ids, {doc_id: i for i, doc_id in enumerate(ids)})
+            self._row_of = cached
+        return cached[1]
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> dict:
+        """Chroma-compatible subset of get(): ids, documents, metadatas and embeddings"""
+        self.refresh()
+        state = self._state
+        all_ids, texts, metadatas, vectors = state.ids, state.texts, state.metadatas, state.vectors
+        if ids is None:
+            rows = list(range(len(all_ids)))
+        else:
+            row_of = self._row_index(all_ids)
+            rows = [row_of[doc_id] for doc_id in ids if doc_id in row_of]
+        result = {"ids": [all_ids[i] for i in rows]}
+        if include is None or "documents" in include:
+            result["documents"] = [texts[i] for i in rows]
+        if include is None or "metadatas" in include:
+            result["metadatas"] = [metadatas[i] for i in rows]
+        if include is not None and "embeddings" in include:
+            result["embeddings"] = np.asarray(vectors[rows], dtype=np.float32)
+        return result
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        self.refresh()
+        # One consistent snapshot, even if a write publishes a new state meanwhile
+        ids, texts, metadatas, vectors, codes, scale, partitions, _ = self._state
+        if not ids:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        # Only the row ranges of the filtered partitions are scanned
+        slices, rest = partition_slices(partitions, self.partition_key, filter)
+        if slices is None:
+            slices = [(0, len(ids))]
+
+        found_rows, found_scores = [], []
+        for start, stop in slices:
+            allowed = None
+            if rest:
+                allowed = np.array([matches_filter(metadatas[i], rest) for i in range(start, stop)], dtype=bool)
+                if not allowed.any():
+                    continue
+            if codes is not None:
+                rows, scores = search_quantized(vectors[start:stop], codes[start:stop], scale, query, k,
+                                                self.rerank_factor, allowed)
+            else:
+                part_scores = vectors[start:stop] @ query
+                if allowed is not None:
+                    part_scores = np.where(allowed, part_scores, -np.inf)
+                rows = top_k_indices(part_scores, k)
+                scores = part_scores[rows]
+            found_rows.append(rows + start)
+            found_scores.append(scores)
+        if not found_rows:
+            return []
+
+        rows, scores = np.concatenate(found_rows), np.concatenate(found_scores)
+        order = top_k_indices(scores, k)
+        rows, scores = rows[order], scores[order]
+
+        results = []
+        for row, score in zip(rows, scores):
+            if not np.isfinite(score):
+                break
+            doc = Document(page_content=texts[row], metadata=metadatas[row], id=ids[row])
+            results.append((doc, float(score)))
+        return results
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, persist_directory: Optional[str] = None,
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding, persist_directory=persist_directory)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
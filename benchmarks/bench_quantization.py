@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Recall@k / latency / memory benchmark: int8-quantized index vs exact float32 scan.
+
+Uses a synthetic clustered corpus shaped like Gemini embeddings (768 dims)
+so it runs offline:
+
+    python benchmarks/bench_quantization.py --rows 100000 --queries 200 --k 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from vector_store import normalize_rows, quantize_int8, search_quantized, top_k_indices  # noqa: E402
+
+
+def make_corpus(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors: embeddings of related articles sit close together"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size=rows)
+    noise = rng.standard_normal((rows, dim)).astype(np.float32) * 0.6
+    return normalize_rows(centers[assignment] + noise)
+
+
+def make_queries(corpus: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Perturbed corpus rows, like a task phrased close to an article"""
+    rng = np.random.default_rng(seed + 1)
+    picked = corpus[rng.integers(0, corpus.shape[0], size=count)]
+    return normalize_rows(picked + rng.standard_normal(picked.shape).astype(np.float32) * 0.3)
+
+
+def run(rows: int, dim: int, queries: int, k: int, rerank_factors, seed: int) -> dict:
+    corpus = make_corpus(rows, dim, clusters=max(8, rows // 500), seed=seed)
+    query_matrix = make_queries(corpus, queries, seed)
+    codes, scale = quantize_int8(corpus)
+
+    # Ground truth and float32 baseline latency
+    truth = []
+    started = time.perf_counter()
+    for query in query_matrix:
+        truth.append(set(top_k_indices(corpus @ query, k).tolist()))
+    exact_ms = (time.perf_counter() - started) * 1000 / queries
+
+    result = {
+        "rows": rows,
+        "dim": dim,
+        "k": k,
+        "float32_bytes": int(corpus.nbytes),
+        "int8_bytes": int(codes.nbytes + scale.nbytes),
+        "memory_ratio": round(corpus.nbytes / (codes.nbytes + scale.nbytes), 2),
+        "exact_ms_per_query": round(exact_ms, 3),
+        "quantized": [],
+    }
+
+    for factor in rerank_factors:
+        hits = 0
+        started = time.perf_counter()
+        for query, expected in zip(query_matrix, truth):
+            found, _ = search_quantized(corpus, codes, scale, query, k, rerank_factor=factor)
+            hits += len(expected & set(found.tolist()))
+        elapsed_ms = (time.perf_counter() - started) * 1000 / queries
+        result["quantized"].append({
+            "rerank_factor": factor,
+            f"recall@{k}": round(hits / (k * queries), 4),
+            "ms_per_query": round(elapsed_ms, 3),
+        })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    result = run(args.rows, args.dim, args.queries, args.k, args.rerank, args.seed)
+
+    print(f"📦 {result['rows']} x {result['dim']} vectors, k={result['k']}")
+    print(f"   float32: {result['float32_bytes'] / 2**20:.1f} MiB, "
+          f"int8: {result['int8_bytes'] / 2**20:.1f} MiB ({result['memory_ratio']}x smaller)")
+    print(f"   exact scan: {result['exact_ms_per_query']} ms/query")
+    for row in result["quantized"]:
+        print(f"   int8 + rerank x{row['rerank_factor']}: recall@{args.k}={row[f'recall@{args.k}']:.4f}, "
+              f"{row['ms_per_query']} ms/query")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmarks of the retrieval and fallback hot paths with regression gates.
+
+Scaled benchmarks run against synthetic knowledge bases of 10x, 100x and
+1000x the entries of RAG_KNOWLEDGE_BASE (and vector corpora of as many
+copies of the knowledge directory chunks). Every benchmark reports the
+best per-call time of several timing runs, which is far less noisy than
+the mean.
+
+Results are compared with the stored baseline: a benchmark that got slower
+by more than --threshold percent makes the run exit with status 1.
+
+    python benchmarks/run_benchmarks.py                      # compare with baseline.json
+    python benchmarks/run_benchmarks.py --filter search      # only matching benchmarks
+    python benchmarks/run_benchmarks.py --update-baseline    # accept the current numbers
+
+Baselines are machine-specific: refresh them with --update-baseline when
+the benchmark host changes. Runs offline (LLM_BACKEND=fake, local embeddings).
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(HERE, "..", "api")
+sys.path.insert(0, API_DIR)
+
+KNOWLEDGE_DIR = os.path.join(HERE, "..", "Data", "Knowledge")
+KNOWLEDGE_FILE = os.path.join(KNOWLEDGE_DIR, "productivity.md")
+
+# The servers are imported for their functions only: no key, no network
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("KNOWLEDGE_DIR", KNOWLEDGE_DIR)
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_SCALES = "10,100,1000"
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", "25"))
+
+PHASES = ("menstruation", "follicular", "ovulation", "luteal")
+
+BENCHMARKS = []
+
+
+def benchmark(name: str, scaled: bool = False):
+    """Register a setup function that returns the callable to time"""
+    def register(setup):
+        BENCHMARKS.append((name, scaled, setup))
+        return setup
+    return register
+
+
+# Synthetic data
+
+def knowledge_words(knowledge_base: dict) -> list:
+    from rag_index import iter_knowledge_entries
+    words = set()
+    for _, _, _, text in iter_knowledge_entries(knowledge_base):
+        words.update(re.findall(r"\w{4,}", text.lower()))
+    return sorted(words)
+
+
+def scale_knowledge_base(knowledge_base: dict, factor: int, seed: int = 0) -> dict:
+    """Copy of the knowledge base with every list holding factor times the items.
+
+    Extra items are existing ones with a few random words of the base
+    appended, so they share its vocabulary and compete in the ranking.
+    """
+    rng = random.Random(seed)
+    words = knowledge_words(knowledge_base)
+
+    def grow(items):
+        extra = [
+            f"{rng.choice(items)} {' '.join(rng.sample(words, 3))}"
+            for _ in range(len(items) * (factor - 1))
+        ]
+        return list(items) + extra
+
+    scaled = copy.deepcopy(knowledge_base)
+    for phase_data in scaled.values():
+        for section, content in phase_data.items():
+            if isinstance(content, list):
+                phase_data[section] = grow(content)
+            elif isinstance(content, dict):
+                for key, value in content.items():
+                    if isinstance(value, list):
+                        content[key] = grow(value)
+    return scaled
+
+
+def load_knowledge_chunks() -> list:
+    from md_chunker import chunk_markdown
+    with open(KNOWLEDGE_FILE, encoding="utf-8") as f:
+        return chunk_markdown(f.read(), {"source": KNOWLEDGE_FILE})
+
+
+_vector_corpora = {}
+
+
+def vector_corpus(factor: int):
+    """NumPy vector store with factor copies of the knowledge chunks (built once per factor)"""
+    if factor not in _vector_corpora:
+        from local_embeddings import HashingEmbeddings
+        from vector_store import NumpyVectorStore
+
+        rng = random.Random(factor)
+        chunks = load_knowledge_chunks()
+        words = sorted({w for doc in chunks for w in re.findall(r"\w{4,}", doc.page_content.lower())})
+        texts, metadatas = [], []
+        for copy_number in range(factor):
+            for doc in chunks:
+                # A few random words keep the copies distinct
+                texts.append(f"{doc.page_content} {' '.join(rng.sample(words, 3))}")
+                metadatas.append(dict(doc.metadata, copy=copy_number))
+        embeddings = HashingEmbeddings()
+        store = NumpyVectorStore(embeddings)
+        store.add_embeddings(texts, embeddings.embed_matrix(texts), metadatas=metadatas)
+        _vector_corpora[factor] = store
+    return _vector_corpora[factor]
+
+
+# Benchmarks: main_rag
+
+@benchmark("rag.search_knowledge_base.phase", scaled=True)
+def bench_rag_search_phase(factor: int):
+    import main_rag
+    from rag_index import KnowledgeSnapshot
+    state = KnowledgeSnapshot(scale_knowledge_base(main_rag.RAG_KNOWLEDGE_BASE, factor))
+    return lambda: main_rag.search_knowledge_base("важная презентация для клиентов", "ovulation", state=state)
+
+
+@benchmark("rag.search_knowledge_base.all", scaled=True)
+def bench_rag_search_all(factor: int):
+    import main_rag
+    from rag_index import KnowledgeSnapshot
+    state = KnowledgeSnapshot(scale_knowledge_base(main_rag.RAG_KNOWLEDGE_BASE, factor))
+    return lambda: main_rag.search_knowledge_base("энергия и продуктивность", main_rag.ALL_PHASES, state=state)
+
+
+@benchmark("rag.generate_fallback_advice", scaled=True)
+def bench_rag_fallback(factor: int):
+    import main_rag
+    from rag_index import KnowledgeSnapshot
+    state = KnowledgeSnapshot(scale_knowledge_base(main_rag.RAG_KNOWLEDGE_BASE, factor))
+    docs = main_rag.search_knowledge_base("сложная аналитическая работа", "luteal", state=state)
+
+    def run():
+        # The fallback reads the module-level snapshot
+        saved, main_rag.kb_state = main_rag.kb_state, state
+        try:
+            main_rag.generate_fallback_advice("Сложная аналитическая работа", "luteal", "ru", docs)
+        finally:
+            main_rag.kb_state = saved
+    return run
+
+
+# Benchmarks: main_simple
+
+@benchmark("simple.get_fallback_advice")
+def bench_simple_fallback():
+    import main_simple
+    phases = PHASES
+    return lambda: [main_simple.get_fallback_advice(phase, "ru") for phase in phases]
+
+
+# Benchmarks: model answer parsing
+
+ADVICE_JSON = json.dumps({"verdict": "good", "reason": "пик энергии и коммуникаций",
+                          "suggestion": "проведите презентацию утром"}, ensure_ascii=False)
+
+
+@benchmark("parse.extract_json_text.plain")
+def bench_extract_plain():
+    from advice_batch import extract_json_text
+    return lambda: json.loads(extract_json_text(ADVICE_JSON))
+
+
+@benchmark("parse.extract_json_text.fenced")
+def bench_extract_fenced():
+    from advice_batch import extract_json_text
+    text = f"Вот мой совет:\n```json\n{ADVICE_JSON}\n```\nУдачи!"
+    return lambda: json.loads(extract_json_text(text))
+
+
+@benchmark("parse.parse_batch_answers.16")
+def bench_parse_batch():
+    from advice_batch import parse_batch_answers
+    answers = [dict(json.loads(ADVICE_JSON), id=i) for i in range(1, 17)]
+    text = "```json\n" + json.dumps(answers, ensure_ascii=False) + "\n```"
+    return lambda: parse_batch_answers(text, 16)
+
+
+# Benchmarks: main.py pipeline (chunking, dense and hybrid retrieval, context)
+
+@benchmark("main.chunk_markdown")
+def bench_chunk_markdown():
+    from md_chunker import chunk_markdown
+    with open(KNOWLEDGE_FILE, encoding="utf-8") as f:
+        text = f.read()
+    return lambda: chunk_markdown(text, {"source": KNOWLEDGE_FILE})
+
+
+@benchmark("main.dense_search", scaled=True)
+def bench_dense_search(factor: int):
+    from cached_retriever import phase_filter
+    from local_embeddings import HashingEmbeddings
+    store = vector_corpus(factor)
+    query = HashingEmbeddings().embed_query("Cycle phase: luteal\nTask: finish the project report")
+    where = phase_filter("luteal")
+    return lambda: store.similarity_search_with_score_by_vector(query, k=4, filter=where)
+
+
+@benchmark("main.hybrid_search", scaled=True)
+def bench_hybrid_search(factor: int):
+    from hybrid_retriever import HybridRetriever
+    from local_embeddings import HashingEmbeddings
+    store = vector_corpus(factor)
+    retriever = HybridRetriever(vectorstore=store)
+    text = "Cycle phase: luteal\nTask: finish the project report"
+    query = HashingEmbeddings().embed_query(text)
+    retriever._search(text, query, "luteal")  # builds the lexical index outside the timing
+    # _search bypasses the query/result caches of the retriever
+    return lambda: retriever._search(text, query, "luteal")
+
+
+@benchmark("main.docs_to_context")
+def bench_docs_to_context():
+    import main
+    docs = load_knowledge_chunks()[:8]
+    return lambda: main.docs_to_context(docs)
+
+
+# Runner
+
+def measure(fn, repeats: int, min_time: float) -> dict:
+    """Best and median seconds per call over `repeats` runs of at least `min_time`"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)) + 1)
+    runs = [elapsed / number] + [t / number for t in timer.repeat(repeats - 1, number)]
+    return {
+        "best_us": round(min(runs) * 1e6, 3),
+        "median_us": round(statistics.median(runs) * 1e6, 3),
+        "loops": number,
+    }
+
+
+def run_benchmarks(scales, pattern: str, repeats: int, min_time: float, only=None) -> dict:
+    results = {}
+    for name, scaled, setup in BENCHMARKS:
+        for factor in (scales if scaled else [None]):
+            key = f"{name}[{factor}x]" if factor else name
+            if (pattern and not re.search(pattern, key)) or (only is not None and key not in only):
+                continue
+            started = time.perf_counter()
+            fn = setup(factor) if scaled else setup()
+            setup_seconds = time.perf_counter() - started
+            result = measure(fn, repeats, min_time)
+            result["setup_seconds"] = round(setup_seconds, 3)
+            results[key] = result
+            print(f"  {key:<45} {result['best_us']:>12.1f} µs  (median {result['median_us']:.1f}, "
+                  f"{result['loops']} loops)")
+    return results
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "system": platform.system(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print the change against the baseline; return the regressed benchmark names"""
+    regressions = []
+    stored = baseline.get("results", {})
+    print(f"\n📊 Against baseline (threshold +{threshold:g}%)")
+    for key, result in results.items():
+        before = stored.get(key)
+        if before is None:
+            print(f"  {key:<45} new")
+            continue
+        change = (result["best_us"] - before["best_us"]) / before["best_us"] * 100
+        regressed = change > threshold
+        if regressed:
+            regressions.append(key)
+        mark = "❌" if regressed else ("✅" if change < -threshold else "  ")
+        print(f"{mark}{key:<45} {before['best_us']:>10.1f} -> {result['best_us']:>10.1f} µs ({change:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path micro-benchmarks with regression gates")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="knowledge base size multipliers")
+    parser.add_argument("--filter", default="", help="regex; run only benchmarks whose name matches")
+    parser.add_argument("--repeats", type=int, default=7, help="timing runs per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.1, help="minimum seconds per timing run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when a benchmark is this many percent slower than the baseline")
+    parser.add_argument("--recheck", type=int, default=2,
+                        help="times a regressed benchmark is measured again before the run fails")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    print(f"⏱️  Benchmarks (scales {scales}, {args.repeats} runs of >= {args.min_time:g}s)")
+    results = run_benchmarks(scales, args.filter, args.repeats, args.min_time)
+    report = {"environment": environment(), "scales": scales, "results": results}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        # A filtered run only replaces the benchmarks it ran
+        merged = {**baseline.get("results", {}), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({**report, "results": dict(sorted(merged.items()))}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n💾 Baseline updated: {args.baseline}")
+        return
+
+    if not os.path.isfile(args.baseline):
+        print(f"\n⚠️  No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if baseline.get("environment") != environment():
+        # Timings from another machine or Python only inform, they do not gate
+        print("\n⚠️  The baseline was recorded on a different machine or Python, so it does not gate this run. "
+              "Run with --update-baseline here to record one.")
+        return
+    # A busy host slows single runs down; a real regression survives re-measuring
+    for attempt in range(args.recheck):
+        if not regressions:
+            break
+        print(f"\n🔁 Re-measuring {len(regressions)} regressed benchmark(s) ({attempt + 1}/{args.recheck})")
+        rerun = run_benchmarks(scales, args.filter, args.repeats, args.min_time, only=set(regressions))
+        for key, result in rerun.items():
+            if result["best_us"] < results[key]["best_us"]:
+                results[key] = result
+        regressions = compare({key: results[key] for key in regressions}, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) regressed by more than {args.threshold:g}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
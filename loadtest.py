@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Load generator for the Female Task Planner API servers.
+
+Drives /advice, /search and /phases with a realistic mix: phases are
+drawn by their share of a 28-day cycle and tasks follow a long-tail
+popularity curve, so repeated tasks hit the caches the way real users do.
+
+Two modes:
+
+- open loop (--rps N): requests are scheduled at a fixed rate no matter how
+  fast the server answers; latency is measured from the scheduled time, so
+  queueing behind a slow server is included instead of hidden
+- closed loop (default): --concurrency workers send back to back
+
+Reports throughput, p50/p95/p99/max latency, error rate and fallback rate
+per endpoint. Fallbacks are taken from the "source" field when the server
+returns one and from the advice_responses_total counters of /metrics.
+
+    python loadtest.py --rps 20 --duration 60 --json results.json
+    python loadtest.py --concurrency 32 --mix advice=6,search=3,phases=1 --compare results.json
+"""
+
+import argparse
+import json
+import math
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+API_BASE = "http://127.0.0.1:8000"
+
+# Days of a 28-day cycle spent in each phase
+PHASE_WEIGHTS = {"menstruation": 5, "follicular": 8, "ovulation": 3, "luteal": 12}
+
+TASKS = {
+    "ru": [
+        "Провести презентацию", "Подготовить отчет", "Тренировка в зале", "Планирование проекта",
+        "Встреча с клиентом", "Сложная аналитическая работа", "Написать статью", "Уборка дома",
+        "Собеседование", "Йога", "Разобрать почту", "Творческий мозговой штурм",
+        "Поход к врачу", "Закончить проект", "Переговоры о зарплате", "Учеба на курсе",
+    ],
+    "en": [
+        "Give a presentation", "Write the quarterly report", "Gym workout", "Plan the project",
+        "Client meeting", "Deep analytical work", "Write an article", "Clean the house",
+        "Job interview", "Yoga class", "Inbox zero", "Creative brainstorm",
+    ],
+}
+
+SEARCH_QUERIES = [
+    "энергия и продуктивность", "важные встречи и презентации", "творческие задачи",
+    "завершение проектов", "спорт и тренировки", "отдых и восстановление", "общение и переговоры",
+]
+
+FALLBACK_SOURCES = {"fallback", "rag_fallback"}
+
+METRIC_RE = re.compile(r'^advice_responses_total\{source="([^"]+)"\} ([0-9.e+-]+)$', re.MULTILINE)
+
+
+def parse_mix(text: str) -> dict:
+    """'advice=8,search=1,phases=1' -> {endpoint: weight}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class Workload:
+    """Random but reproducible request stream"""
+
+    def __init__(self, mix: dict, locale_ru: float, seed: int):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.endpoints = list(mix)
+        self.endpoint_weights = [mix[name] for name in self.endpoints]
+        self.phases = list(PHASE_WEIGHTS)
+        self.phase_weights = [PHASE_WEIGHTS[p] for p in self.phases]
+        self.locale_ru = locale_ru
+        # Popularity ~ 1/rank: a few tasks are very common, most are rare
+        self.task_weights = {locale: [1.0 / (rank + 1) for rank in range(len(tasks))] for locale, tasks in TASKS.items()}
+
+    def next(self):
+        """(endpoint name, method, path, json body)"""
+        with self.lock:
+            rng = self.rng
+            endpoint = rng.choices(self.endpoints, self.endpoint_weights)[0]
+            phase = rng.choices(self.phases, self.phase_weights)[0]
+            if endpoint == "advice":
+                locale = "ru" if rng.random() < self.locale_ru else "en"
+                task = rng.choices(TASKS[locale], self.task_weights[locale])[0]
+                return endpoint, "POST", "/advice", {"task": task, "phase": phase, "locale": locale}
+            if endpoint == "search":
+                return endpoint, "POST", "/search", {"query": rng.choice(SEARCH_QUERIES), "limit": 3}
+            if endpoint == "phase":
+                return endpoint, "GET", f"/phases/{phase}", None
+            return endpoint, "GET", "/phases", None
+
+
+class Recorder:
+    """Per-endpoint latencies and outcome counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.counts = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, seconds: float, outcome: str):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.counts[endpoint][outcome] += 1
+
+
+_local = threading.local()
+
+
+def session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def send(base: str, request, timeout: float) -> str:
+    """Send one request; return its outcome: ok, fallback, http_<code> or error"""
+    endpoint, method, path, body = request
+    try:
+        response = session().request(method, base + path, json=body, timeout=timeout)
+    except requests.RequestException:
+        return "error"
+    if response.status_code != 200:
+        return f"http_{response.status_code}"
+    if endpoint == "advice":
+        try:
+            source = response.json().get("source")
+        except ValueError:
+            return "error"
+        if source in FALLBACK_SOURCES:
+            return "fallback"
+    return "ok"
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, counts: dict, seconds: float) -> dict:
+    values = sorted(latencies)
+    total = len(values)
+    errors = sum(count for outcome, count in counts.items() if outcome not in ("ok", "fallback"))
+    return {
+        "requests": total,
+        "throughput_rps": round(total / seconds, 2) if seconds else None,
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        "mean_ms": round(sum(values) / total * 1000, 1) if total else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "fallback_rate": round(counts.get("fallback", 0) / total, 4) if total else 0.0,
+        "outcomes": dict(counts),
+    }
+
+
+def scrape_advice_sources(base: str) -> dict:
+    """advice_responses_total by source from /metrics (empty if unavailable)"""
+    try:
+        text = requests.get(base + "/metrics", timeout=5).text
+    except requests.RequestException:
+        return {}
+    return {source: float(value) for source, value in METRIC_RE.findall(text)}
+
+
+def available_endpoints(base: str, mix: dict) -> dict:
+    """Drop mix entries the server does not implement (e.g. /search on main_simple)"""
+    routes = {"advice": "/advice", "search": "/search", "phases": "/phases", "phase": "/phases/{phase}"}
+    try:
+        paths = requests.get(base + "/openapi.json", timeout=5).json().get("paths", {})
+    except (requests.RequestException, ValueError):
+        return mix
+    kept = {}
+    for name, weight in mix.items():
+        if name not in routes:
+            sys.exit(f"❌ Unknown endpoint in --mix: {name} (choose from {', '.join(routes)})")
+        if routes[name] in paths:
+            kept[name] = weight
+        else:
+            print(f"⚠️  {routes[name]} is not served by {base}, skipping it")
+    return kept
+
+
+def run_closed_loop(base, workload, recorder, concurrency, duration, timeout):
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            request = workload.next()
+            started = time.perf_counter()
+            outcome = send(base, request, timeout)
+            recorder.record(request[0], time.perf_counter() - started, outcome)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(base, workload, recorder, rps, concurrency, duration, timeout):
+    """Schedule requests at a fixed rate; workers pick them up as they free up"""
+    pending = queue.Queue()
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            scheduled, request = item
+            outcome = send(base, request, timeout)
+            # From the scheduled time: waiting for a free worker counts as latency
+            recorder.record(request[0], time.perf_counter() - scheduled, outcome)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    interval = 1.0 / rps
+    started = time.perf_counter()
+    for i in range(int(rps * duration)):
+        scheduled = started + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((scheduled, workload.next()))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+
+
+def compare(current: dict, previous_path: str):
+    """Print the change of the main numbers against an earlier results file"""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\n📊 Compared with {previous_path}")
+    for endpoint, stats in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        parts = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate", "fallback_rate"):
+            old, new = before.get(key), stats.get(key)
+            if old:
+                parts.append(f"{key} {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+            else:
+                parts.append(f"{key} {old} -> {new}")
+        print(f"   {endpoint}: " + ", ".join(parts))
+
+
+def print_report(results: dict):
+    print(f"\n{'endpoint':<10}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'err%':>8}{'fb%':>8}")
+    for endpoint, stats in list(results["endpoints"].items()) + [("total", results["total"])]:
+        print(f"{endpoint:<10}{stats['requests']:>8}{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['max_ms']:>9}"
+              f"{stats['error_rate'] * 100:>8.2f}{stats['fallback_rate'] * 100:>8.2f}")
+    server = results.get("server_advice_sources")
+    if server:
+        print(f"\n🖥️  Server-side advice sources: {server} (fallback rate {results['server_fallback_rate']:.2%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the advice API")
+    parser.add_argument("--base", default=API_BASE, help="server URL")
+    parser.add_argument("--rps", type=float, default=0, help="target request rate (open loop); 0 = closed loop")
+    parser.add_argument("--concurrency", type=int, default=16, help="worker threads")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--mix", default="advice=8,search=1,phases=1",
+                        help="endpoint weights: advice, search, phases, phase (/phases/{phase})")
+    parser.add_argument("--locale-ru", type=float, default=0.8, help="share of Russian advice requests")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout, seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--max-error-rate", type=float, help="exit with status 1 above this error rate")
+    args = parser.parse_args()
+
+    mix = available_endpoints(args.base, parse_mix(args.mix))
+    if not mix:
+        sys.exit("❌ None of the requested endpoints are served")
+    workload = Workload(mix, args.locale_ru, args.seed)
+    recorder = Recorder()
+
+    mode = f"{args.rps:g} rps open loop" if args.rps else "closed loop"
+    print(f"🚀 {args.base}: {mode}, {args.concurrency} workers, {args.duration:g}s, mix {mix}")
+    sources_before = scrape_advice_sources(args.base)
+    started = time.perf_counter()
+    if args.rps:
+        run_open_loop(args.base, workload, recorder, args.rps, args.concurrency, args.duration, args.timeout)
+    else:
+        run_closed_loop(args.base, workload, recorder, args.concurrency, args.duration, args.timeout)
+    elapsed = time.perf_counter() - started
+    sources_after = scrape_advice_sources(args.base)
+
+    all_latencies, all_counts = [], defaultdict(int)
+    for endpoint, counts in recorder.counts.items():
+        all_latencies.extend(recorder.latencies[endpoint])
+        for outcome, count in counts.items():
+            all_counts[outcome] += count
+
+    results = {
+        "config": {**vars(args), "mix": mix, "mode": "open" if args.rps else "closed"},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_seconds": round(elapsed, 2),
+        "endpoints": {
+            endpoint: summarize(recorder.latencies[endpoint], counts, elapsed)
+            for endpoint, counts in sorted(recorder.counts.items())
+        },
+        "total": summarize(all_latencies, all_counts, elapsed),
+    }
+
+    # Servers without a "source" field (main_simple, main) still count fallbacks in /metrics
+    delta = {source: sources_after.get(source, 0) - sources_before.get(source, 0) for source in sources_after}
+    if sum(delta.values()):
+        results["server_advice_sources"] = delta
+        results["server_fallback_rate"] = round(delta.get("fallback", 0) / sum(delta.values()), 4)
+
+    print_report(results)
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Results written to {args.json}")
+
+    if args.max_error_rate is not None and results["total"]["error_rate"] > args.max_error_rate:
+        print(f"❌ Error rate {results['total']['error_rate']:.2%} is above {args.max_error_rate:.2%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
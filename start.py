@@ -6,8 +6,12 @@ import sys
 import subprocess
 import webbrowser
 import time
+import urllib.error
+import urllib.request
 from pathlib import Path
 
+API_BASE = "http://127.0.0.1:8000"
+
 def check_env_file():
     """Проверяем наличие .env файла"""
     env_path = Path(".env")
@@ -43,6 +47,26 @@ def start_backend():
         print(f"❌ Ошибка запуска backend: {e}")
         return False
 
+def wait_for_backend(timeout: float = 60.0) -> bool:
+    """Ждем готовности сервера: /ready (если есть) или /health"""
+    started = time.time()
+    while time.time() - started < timeout:
+        for path in ("/ready", "/health"):
+            try:
+                with urllib.request.urlopen(f"{API_BASE}{path}", timeout=2) as resp:
+                    if resp.status == 200:
+                        print(f"✅ Сервер готов за {time.time() - started:.1f} с")
+                        return True
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    continue  # у сервера нет /ready, проверяем /health
+                break  # 503 - сервер поднят, но еще прогревается
+            except Exception:
+                break  # порт еще не открыт
+        time.sleep(0.5)
+    print(f"⚠️  Сервер не ответил за {timeout:.0f} с")
+    return False
+
 def open_frontend():
     """Открываем frontend в браузере"""
     print("🌐 Открываем frontend...")
@@ -66,17 +90,17 @@ def main():
     if not start_backend():
         return
     
-    # Ждем немного для запуска сервера
+    # Ждем, пока сервер не будет готов принимать запросы
     print("⏳ Ждем запуска сервера...")
-    time.sleep(3)
+    wait_for_backend()
     
     # Открываем frontend
     open_frontend()
     
     print("\n🎉 Система запущена!")
     print("📱 Frontend: откройте Frontend/index.html в браузере")
-    print("🔧 Backend API: http://127.0.0.1:8000")
-    print("📖 Документация API: http://127.0.0.1:8000/docs")
+    print(f"🔧 Backend API: {API_BASE}")
+    print(f"📖 Документация API: {API_BASE}/docs")
     print("\n💡 Для остановки нажмите Ctrl+C")
 
 if __name__ == "__main__":